@@ -0,0 +1,254 @@
+#
+# Copyright (c) 2026 Team VMPSADBW
+# All rights reserved.
+#
+# This code is licensed under the BSD 3-Clause License.
+#
+
+# Mission benchmark: runs project_3.py's whole mission in the simulation (see sim/), and breaks
+# down where its time went, leg by leg.
+#
+#   python3 bench/mission.py [--every B:2000] [--cpu-scale 1] [--json FILE] [any of sim/run.py's options]
+#
+# Time is virtual time on the main thread, as that's the one the mission runs on. Every moment of
+# it goes to exactly one of these, whichever was entered last (so a turn while delivering counts
+# as turning, not delivering):
+#   planning   generate_path_for_destination/replan_path_for_destination, and waiting on plan_mission
+#   turning    Robot.turn, until it has settled
+#   driving    Robot.move_by_tiles
+#   approach   Robot.final_approach, driving in on the (median filtered) distance sensor until
+#              close enough to a house, or the drive_for it falls back on ("scoots") if the
+#              sensor can't see it
+#   belt       Robot.drop_package, spinning the belt to drop the package off
+#   delivery   the rest of Robot.deliver_package, i.e. backing out
+#   audio      play_audio calls that block until the clip is done (most just queue it up)
+#   operator   waiting on the operator to press something
+#   other      anything else
+#
+# Planning mostly happens on plan_mission's own thread instead, which is only reported as a
+# total ("bg plan"), as it isn't done leg by leg. Code only takes up virtual time with
+# --cpu-scale above 0, which here defaults to 1 (host CPU time counts as is). The brain is a lot
+# slower than a computer, so scale it up to see what planning would cost there.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(_HERE), "sim"))
+
+import run as sim
+import vex
+
+CATEGORIES = ("planning", "turning", "driving", "approach", "belt", "delivery", "audio", "operator", "other")
+COUNTERS = ("turns", "scoots", "replans")
+
+class Section:
+    def __init__(self, name):
+        self.name = name
+        self.ms = dict([(category, 0.0) for category in CATEGORIES])
+        self.counts = dict([(counter, 0) for counter in COUNTERS])
+
+    def total(self):
+        return sum(self.ms.values())
+
+    def to_json(self):
+        result = {"name": self.name, "total_ms": round(self.total(), 1)}
+        for category in CATEGORIES:
+            result[category + "_ms"] = round(self.ms[category], 1)
+        result.update(self.counts)
+        return result
+
+# Splits the main thread's time up by category, into sections: the startup, one per leg, and
+# the wrap-up after the last leg
+class Timeline:
+    def __init__(self):
+        self.stack = []
+        self.mark = vex.SCHEDULER.charge()
+        self.section = Section("startup")
+        self.sections = [self.section]
+        self.legs = 0
+        self.bg_plan_ms = 0.0 # planning done on other threads, and how many searches that was
+        self.bg_plans = 0
+
+    def flush(self):
+        now = vex.SCHEDULER.charge()
+        category = self.stack[-1] if self.stack else "other"
+        self.section.ms[category] += now - self.mark
+        self.mark = now
+
+    def enter(self, category):
+        self.flush()
+        self.stack.append(category)
+
+    def exit(self):
+        self.flush()
+        self.stack.pop()
+
+    def start_section(self, name):
+        self.flush()
+        self.section = Section(name)
+        self.sections.append(self.section)
+
+    # Hands the current section's time over to the one before it, and carries on in that one
+    def fold(self):
+        self.flush()
+        section = self.sections.pop()
+        self.section = self.sections[-1]
+        for category in CATEGORIES:
+            self.section.ms[category] += section.ms[category]
+        for counter in COUNTERS:
+            self.section.counts[counter] += section.counts[counter]
+
+    def count(self, counter):
+        self.section.counts[counter] += 1
+
+def on_main_thread():
+    return vex.SCHEDULER.current() is vex.SCHEDULER.main
+
+def timed(timeline, fn, category):
+    def wrapper(*args, **kwargs):
+        if not on_main_thread():
+            return fn(*args, **kwargs)
+        timeline.enter(category)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timeline.exit()
+    return wrapper
+
+def counted(timeline, fn, counter, only_in = None):
+    def wrapper(*args, **kwargs):
+        if on_main_thread() and (only_in is None or timeline.stack[-1:] == [only_in]):
+            timeline.count(counter)
+        return fn(*args, **kwargs)
+    return wrapper
+
+def instrument(program, timeline):
+    robot = program.Robot
+    robot.turn = counted(timeline, timed(timeline, robot.turn, "turning"), "turns")
+    robot.move_by_tiles = timed(timeline, robot.move_by_tiles, "driving")
+    robot.final_approach = timed(timeline, robot.final_approach, "approach")
+    robot.deliver_package = timed(timeline, robot.deliver_package, "delivery")
+    robot.drop_package = timed(timeline, robot.drop_package, "belt")
+
+    drivetrain = program.drivetrain
+    drivetrain.drive_for = counted(timeline, drivetrain.drive_for, "scoots", "approach")
+
+    play_audio = program.play_audio
+    def play_audio_timed(fname, blocking = False, *args, **kwargs):
+        if not blocking or not on_main_thread():
+            return play_audio(fname, blocking, *args, **kwargs)
+        timeline.enter("audio")
+        try:
+            return play_audio(fname, blocking, *args, **kwargs)
+        finally:
+            timeline.exit()
+    program.play_audio = play_audio_timed
+
+    program.wait_for_operator = timed(timeline, program.wait_for_operator, "operator")
+    program.wait_for_mission_plan = timed(timeline, program.wait_for_mission_plan, "planning")
+    program.replan_path_for_destination = counted(
+        timeline, timed(timeline, program.replan_path_for_destination, "planning"), "replans")
+
+    generate = timed(timeline, program.generate_path_for_destination, "planning")
+    def generate_timed(target, *args, **kwargs):
+        if on_main_thread():
+            return generate(target, *args, **kwargs)
+        start = vex.SCHEDULER.charge()
+        try:
+            return generate(target, *args, **kwargs)
+        finally:
+            timeline.bg_plan_ms += vex.SCHEDULER.charge() - start
+            timeline.bg_plans += 1
+    program.generate_path_for_destination = generate_timed
+
+    travel_to = program.travel_to
+    def travel_to_timed(leg):
+        # the time between two legs is picking the next one, which goes with the leg before it
+        if timeline.legs:
+            timeline.fold()
+        timeline.legs += 1
+        timeline.start_section("%d %s" % (timeline.legs, leg.target.name))
+        try:
+            return travel_to(leg)
+        finally:
+            timeline.start_section("wrap-up")
+    program.travel_to = travel_to_timed
+
+def print_table(sections, total):
+    header = "%-16s %9s" % ("section", "total") + "".join([" %9s" % c for c in CATEGORIES])
+    header += " %6s %6s %7s" % ("turns", "scoots", "replans")
+    print(header)
+    print("-" * len(header))
+    for section in sections + [total]:
+        if section is total:
+            print("-" * len(header))
+        row = "%-16s %9.0f" % (section.name[:16], section.total())
+        row += "".join([" %9.0f" % section.ms[c] for c in CATEGORIES])
+        row += " %6d %6d %7d" % (section.counts["turns"], section.counts["scoots"], section.counts["replans"])
+        print(row)
+
+def main():
+    parser = argparse.ArgumentParser(description="Break a simulated mission's time down by leg")
+    sim.add_arguments(parser)
+    parser.set_defaults(cpu_scale=1.0, quiet=True)
+    parser.add_argument("--verbose", dest="quiet", action="store_false", help="show the program's own output")
+    parser.add_argument("--json", default=None, help="also write the breakdown here")
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    if args.quiet:
+        sys.stdout = open(os.devnull, "w")
+
+    wall_start = time.perf_counter()
+    try:
+        program = sim.prepare(args)
+        timeline = Timeline()
+        timeline.section.ms["other"] += timeline.mark # the VEXcode calibration, at load
+        instrument(program, timeline)
+        stop_reason = sim.run_main(program)
+        timeline.flush()
+    finally:
+        wall_ms = (time.perf_counter() - wall_start) * 1000.0
+        if args.quiet:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    sections = timeline.sections
+    total = Section("total")
+    for section in sections:
+        for category in CATEGORIES:
+            total.ms[category] += section.ms[category]
+        for counter in COUNTERS:
+            total.counts[counter] += section.counts[counter]
+
+    print_table(sections, total)
+    print("")
+    overall = total.total()
+    for category in CATEGORIES:
+        share = 100.0 * total.ms[category] / overall if overall else 0.0
+        print("%-10s %10.0f ms %5.1f%%" % (category, total.ms[category], share))
+    print("%-10s %10.0f ms over %d searches, off the main thread" % ("bg plan", timeline.bg_plan_ms, timeline.bg_plans))
+    print("%-10s %10.0f ms (virtual), %.0f ms wall, stopped by %s" % ("mission", overall, wall_ms, stop_reason))
+
+    if args.json:
+        result = {
+            "stop": stop_reason,
+            "virtual_ms": round(overall, 1),
+            "wall_ms": round(wall_ms, 1),
+            "cpu_scale": args.cpu_scale,
+            "bg_plan_ms": round(timeline.bg_plan_ms, 1),
+            "bg_plans": timeline.bg_plans,
+            "sections": [s.to_json() for s in sections],
+            "total": total.to_json(),
+        }
+        with open(args.json, "w") as f:
+            f.write(json.dumps(result, indent=2) + "\n")
+
+    return 0 if stop_reason == "program_stop" else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
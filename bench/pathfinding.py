@@ -0,0 +1,341 @@
+#
+# Copyright (c) 2026 Team VMPSADBW
+# All rights reserved.
+#
+# This code is licensed under the BSD 3-Clause License.
+#
+
+# Pathfinding benchmark: times project_3.py's `astar` on generated maps, and writes what it
+# found to a JSON file (bench/pathfinding-<runtime>.json unless --out says otherwise).
+#
+#   python3 bench/pathfinding.py [--quick] [--no-alloc] [--repeat N] [--seed N] [--out FILE]
+#   python3 bench/pathfinding.py --check-hpa [--seed N]
+#   micropython -X heapsize=64M bench/pathfinding.py ...
+#
+# Maps are seeded, and made with our own random number generator, so the exact same maps come
+# out under CPython and MicroPython. Run it under MicroPython's unix port for numbers that are
+# closer to what the brain does (the brain is still a good deal slower, and has far less heap).
+#
+# Every map is searched from its bottom left corner to its top right one, with the robot facing
+# north, once per (unitless) turn cost, once with the time based costs the robot plans with by
+# default ("time", see PlanCosts), and once more with turn costs ignored. For each search we record:
+#   best_ms, mean_ms  time per search
+#   expanded          states popped off the open set
+#   pushes, peak      pushes onto the open set (including decrease-keys), and its largest size
+#   alloc_bytes       heap allocated by one search. Under MicroPython that's everything allocated
+#                     with the GC off, and under CPython it's the peak traced by tracemalloc, so
+#                     compare these within one runtime only
+#   found, cost, turns, tiles   what the path came out as
+#
+# --check-hpa runs no benchmark, and instead checks HierarchicalPlanner against `astar` on the
+# same queries (see check_hpa), exiting with 1 if HPA* misses a path that `astar` finds.
+#
+# This goes through the sim's vex stand-in, so it has to stick to what MicroPython has, too.
+
+import gc
+import json
+import sys
+import time
+
+def _dirname(path):
+    if "/" not in path:
+        return "."
+    return path.rsplit("/", 1)[0] or "/"
+
+try:
+    _HERE = _dirname(__file__)
+except NameError:
+    _HERE = _dirname(sys.argv[0])
+_REPO = _dirname(_HERE) if _HERE != "." else ".."
+
+sys.path.insert(0, _REPO + "/sim")
+sys.path.insert(0, _REPO)
+
+import project_3
+
+# The map size limits are there for the brain's heap, and there's a lot more than that here
+project_3.CONST_MAX_WIDTH = 256
+project_3.CONST_MAX_HEIGHT = 256
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+SIZES = (6, 24, 64, 128, 256)
+QUICK_SIZES = (6, 24, 64)
+RANDOM_DENSITIES = (0.1, 0.2, 0.3) # fraction of tiles blocked (and as many again made expensive)
+MAZE_DENSITIES = (1.0, 0.7) # fraction of a perfect maze's walls kept, fewer walls means more loops
+TURN_COSTS = (1, 5, 10, "time")
+
+CHECK_SIZE = 48
+CHECK_CLUSTER = 8
+CHECK_MAPS = 20
+CHECK_QUERIES = 12 # per map
+
+if MICROPYTHON:
+    def _now_us():
+        return time.ticks_us()
+
+    def _elapsed_us(start):
+        return time.ticks_diff(time.ticks_us(), start)
+else:
+    def _now_us():
+        return time.perf_counter() * 1000000.0
+
+    def _elapsed_us(start):
+        return time.perf_counter() * 1000000.0 - start
+
+# xorshift32, so that maps don't depend on the runtime's `random`
+class Rng:
+    def __init__(self, seed):
+        self.state = ((seed * 2654435761) + 1) & 0xFFFFFFFF or 1
+
+    def next(self):
+        x = self.state
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        self.state = x
+        return x
+
+    def below(self, n):
+        return self.next() % n
+
+    def chance(self, p):
+        return self.next() < p * 4294967296.0
+
+def random_map(size, density, rng):
+    grid = project_3.GridMap(size, size)
+    for y in range(size + 1):
+        for x in range(size + 1):
+            if rng.chance(density):
+                grid.set_weight((x, y), project_3.CONST_WEIGHT_UNTRAVERESABLE)
+            elif rng.chance(density):
+                grid.set_weight((x, y), 2 + rng.below(3))
+
+    start = (0, 0)
+    goal = (size, size)
+    grid.set_weight(start, 1)
+    grid.set_weight(goal, 1)
+    return grid, start, goal
+
+# A maze carved (depth first) through the tiles with both coordinates even, then with some of
+# its walls knocked back out again
+def maze_map(size, density, rng):
+    grid = project_3.GridMap(size, size)
+    blocked = project_3.CONST_WEIGHT_UNTRAVERESABLE
+    for y in range(size + 1):
+        for x in range(size + 1):
+            if x % 2 or y % 2:
+                grid.set_weight((x, y), blocked)
+
+    last = size - size % 2
+    visited = set([(0, 0)])
+    stack = [(0, 0)]
+    while stack:
+        x, y = stack[-1]
+        options = []
+        for dx, dy in ((2, 0), (-2, 0), (0, 2), (0, -2)):
+            nx = x + dx
+            ny = y + dy
+            if 0 <= nx <= last and 0 <= ny <= last and (nx, ny) not in visited:
+                options.append((nx, ny))
+        if not options:
+            stack.pop()
+            continue
+        nx, ny = options[rng.below(len(options))]
+        grid.set_weight(((x + nx) // 2, (y + ny) // 2), 1)
+        visited.add((nx, ny))
+        stack.append((nx, ny))
+
+    if density < 1.0:
+        for y in range(size + 1):
+            for x in range(size + 1):
+                # only walls that are between two cells, not the ones at their corners
+                if (x % 2) != (y % 2) and grid.weight_at(grid.index((x, y))) < 0 and not rng.chance(density):
+                    grid.set_weight((x, y), 1)
+
+    return grid, (0, 0), (last, last)
+
+def count_turns(path, start_heading):
+    turns = 0
+    heading = start_heading
+    for segment in path.segments:
+        if segment[0] != heading:
+            turns += 1
+        heading = segment[0]
+    return turns
+
+def search(grid, start, goal, turn_cost):
+    time_costs = project_3.CONFIG_TIME_COSTS
+    old_turn_cost = project_3.CONFIG_TURN_COST
+    try:
+        project_3.CONFIG_TIME_COSTS = turn_cost == "time"
+        if turn_cost is None:
+            return project_3.astar_internal(grid, start, goal, 0, True)
+        if turn_cost != "time":
+            project_3.CONFIG_TURN_COST = turn_cost
+        return project_3.astar(grid, start, goal, 0)
+    finally:
+        project_3.CONFIG_TIME_COSTS = time_costs
+        project_3.CONFIG_TURN_COST = old_turn_cost
+
+def measure_alloc(grid, start, goal, turn_cost):
+    if MICROPYTHON:
+        gc.collect()
+        before = gc.mem_alloc()
+        gc.disable()
+        try:
+            search(grid, start, goal, turn_cost)
+            return gc.mem_alloc() - before
+        except MemoryError:
+            return None
+        finally:
+            gc.enable()
+
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        search(grid, start, goal, turn_cost)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_case(kind, size, density, turn_cost, grid, start, goal, repeat, alloc):
+    case = {
+        "map": kind,
+        "size": size,
+        "density": density,
+        "turn_cost": turn_cost,
+        "mode": "ignore_turn" if turn_cost is None else "astar",
+    }
+
+    times = []
+    path = None
+    try:
+        for _ in range(repeat):
+            gc.collect()
+            start_us = _now_us()
+            path = search(grid, start, goal, turn_cost)
+            times.append(_elapsed_us(start_us))
+    except MemoryError:
+        case["error"] = "MemoryError"
+        return case
+
+    stats = project_3._ASTAR_STATS
+    case["best_ms"] = round(min(times) / 1000.0, 3)
+    case["mean_ms"] = round(sum(times) / len(times) / 1000.0, 3)
+    case["expanded"] = stats.expanded
+    case["pushes"] = stats.pushes
+    case["peak"] = stats.peak
+    case["found"] = path is not None
+    if path is not None:
+        case["cost"] = path.cost
+        case["tiles"] = len(path)
+        case["turns"] = count_turns(path, project_3.HEADING_NORTH)
+    if alloc:
+        case["alloc_bytes"] = measure_alloc(grid, start, goal, turn_cost)
+    return case
+
+# Plans with HPA* and `astar` to goals that are blocked (like a house is) and right on a cluster's
+# border, so can only be stepped onto from some of the clusters around them. HPA* routes may come
+# out longer, but it should never miss one that `astar` finds.
+# Returns (queries, [(start, goal)] that HPA* missed).
+def check_hpa(seed):
+    blocked = project_3.CONST_WEIGHT_UNTRAVERESABLE
+    queries = 0
+    missed = []
+    for i in range(CHECK_MAPS):
+        rng = Rng(seed * 7919 + i)
+        grid, _, _ = random_map(CHECK_SIZE, 0.2, rng)
+        hpa = project_3.HierarchicalPlanner(grid, CHECK_CLUSTER)
+        for _ in range(CHECK_QUERIES):
+            # the last column/row of one cluster, or the first of the next
+            border = CHECK_CLUSTER * (1 + rng.below(CHECK_SIZE // CHECK_CLUSTER)) - rng.below(2)
+            along = rng.below(CHECK_SIZE + 1)
+            goal = (border, along) if rng.below(2) else (along, border)
+            start = (rng.below(CHECK_SIZE + 1), rng.below(CHECK_SIZE + 1))
+            if start == goal or grid.weight_at(grid.index(start)) < 0:
+                continue
+
+            grid.set_weight(goal, blocked)
+            queries += 1
+            if project_3.astar(grid, start, goal, 0) is not None and hpa.plan(start, 0, goal) is None:
+                missed.append((start, goal))
+        hpa.close()
+    return queries, missed
+
+def parse_args(argv):
+    options = {"quick": False, "alloc": True, "repeat": None, "seed": 1, "out": None, "check_hpa": False}
+    i = 1
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "--quick":
+            options["quick"] = True
+        elif arg == "--no-alloc":
+            options["alloc"] = False
+        elif arg == "--check-hpa":
+            options["check_hpa"] = True
+        elif arg in ("--repeat", "--seed", "--out") and i + 1 < len(argv):
+            i += 1
+            options[arg[2:]] = argv[i] if arg == "--out" else int(argv[i])
+        else:
+            print("usage: pathfinding.py [--quick] [--no-alloc] [--repeat N] [--seed N] [--out FILE] [--check-hpa]")
+            sys.exit(2)
+        i += 1
+    return options
+
+def main():
+    options = parse_args(sys.argv)
+    project_3.CONFIG_PRINT_LOG_DEPTH = project_3.LogType.LOG_ERR # keep the planner quiet
+
+    if options["check_hpa"]:
+        queries, missed = check_hpa(options["seed"])
+        for start, goal in missed:
+            print("hpa missed a path from %s to %s" % (start, goal))
+        print("hpa: %d of %d queries missed a path" % (len(missed), queries))
+        sys.exit(1 if missed else 0)
+
+    maps = []
+    for size in QUICK_SIZES if options["quick"] else SIZES:
+        for density in RANDOM_DENSITIES:
+            maps.append(("random", size, density))
+        for density in MAZE_DENSITIES:
+            maps.append(("maze", size, density))
+
+    cases = []
+    for kind, size, density in maps:
+        rng = Rng(options["seed"] * 1000003 + size * 101 + int(density * 100))
+        if kind == "random":
+            grid, start, goal = random_map(size, density, rng)
+        else:
+            grid, start, goal = maze_map(size, density, rng)
+
+        repeat = options["repeat"]
+        if repeat is None:
+            repeat = 5 if size <= 64 else 1
+
+        for turn_cost in TURN_COSTS + (None,):
+            case = run_case(kind, size, density, turn_cost, grid, start, goal, repeat, options["alloc"])
+            cases.append(case)
+            print("%-6s %4d %.1f %-11s tc=%-4s %10s ms  expanded %-7s pushes %-7s peak %-6s turns %s" % (
+                kind, size, density, case["mode"], turn_cost, case.get("best_ms", case.get("error")),
+                case.get("expanded"), case.get("pushes"), case.get("peak"), case.get("turns")))
+
+        grid = None
+        gc.collect()
+
+    out = options["out"]
+    if out is None:
+        out = "%s/pathfinding-%s.json" % (_HERE, sys.implementation.name)
+    result = {
+        "runtime": sys.implementation.name,
+        "version": sys.version,
+        "seed": options["seed"],
+        "indexed_heap": project_3.CONFIG_ASTAR_INDEXED_HEAP,
+        "cases": cases,
+    }
+    with open(out, "w") as f:
+        f.write(json.dumps(result))
+    print("wrote %s" % out)
+
+if __name__ == "__main__":
+    main()
@@ -122,6 +122,7 @@ calibrate_drivetrain()
 # panic reasons are defined in `class PanicReason`
 #
 # Printing to the console is done through `print_message`. All `log_` functionality is purely for the logging system
+# `log_event` takes a format and its args separately, and only formats them if the log is actually printed
 #
 # CODE STYLE
 # CONFIG_* variables are global configuration variables
@@ -177,8 +178,22 @@ calibrate_drivetrain()
 # we make a callback for the functionality of all relevant buttons at each state, and inside the callback we check if 
 # the expected state matches the current state and only operate if they do match. 
 #
+# SIMULATION:
+#
+# sim/ has a stand-in for the `vex` module (and `urandom`), with a simulated robot and a virtual clock,
+# so that a whole mission can be run on a computer with `python3 sim/run.py`. It only covers what this
+# file uses, so anything new used from `vex` needs adding there as well.
+#
+# bench/ has benchmarks that run this file on top of that (see each one for how to run it).
+#
+# RELEASE BUILDS:
+#
+# `python3 tools/strip_logs.py` writes a copy of this file to build/project_3.py with every TRACE and
+# DEBUG `log_event` call taken out, which is the one that should go on the robot for a competition.
+# It only removes calls that are statements of their own, so never use `log_event`'s result.
+#
 
-# no library imports for now
+from array import array # flat, compact storage for map weights
 #
 #
 #
@@ -194,14 +209,39 @@ calibrate_drivetrain()
 #
 
 # These two variables exist to limit the size of the map.
-# The limits exist because internally we construct a large 2D array of `Tile`s to represent the map.
+# The limits exist because internally we store one signed byte per tile to represent the map.
 # Computers have limited memory, so eventually it will OOM (out of memory),
 # and these just exist to make sure we can safely exit before that happens
-CONST_MAX_WIDTH = 128
-CONST_MAX_HEIGHT = 128
+#
+# These used to be 128 when every tile was its own `Tile` object (tens of bytes each). A tile
+# is now 2 bytes (its weight and its links, see GridMap), but the planner has to fit alongside
+# the map, and on maps this big that's HierarchicalPlanner's abstract graph. bench/pathfinding.py's
+# 64x64 maps with 10-20% of tiles blocked come to ~300 entry nodes and ~5000 edges between them
+# (counted under CPython, which builds the same graph). At ~24 bytes an edge on MicroPython (a
+# 2-tuple plus its list slot) that's ~130KB, on top of ~8KB of map and the program itself (~40KB
+# of bytecode as a .mpy). The graph grows with the map's area: 128x128 comes to ~20000 edges, or
+# ~500KB, which is more than the brain's whole heap.
+CONST_MAX_WIDTH = 64
+CONST_MAX_HEIGHT = 64
 # ESP32 based, 520KB SRAM, Brain Main Memory is 320KB Heap
 
 CONST_WEIGHT_UNTRAVERESABLE = -1
+CONST_WEIGHT_MIN = -128 # Limits of a signed byte, which is how weights are stored
+CONST_WEIGHT_MAX = 127
+
+CONST_SPAN_BUCKETS = 16 # Histogram buckets per timed span (see SpanStats), each twice as wide as the last,
+CONST_SPAN_BUCKET_US = 250 # starting from under this many microseconds. So the last one is 4 seconds and up
+
+CONST_WAV_HEADER_BYTES = 64 # How much of a WAV file we read to find its format and length. Plain 44 byte
+                            # headers fit, anything with extra chunks up front just gets its length guessed
+
+# Clips the program plays by name, so they can be checked for at init (see check_audio). Each
+# location's own clip is checked too.
+CONST_AUDIO_CLIPS = (
+    "on.wav", "initialized.wav", "adjusting.wav", "travelling_to.wav", "complete.wav", "continuing.wav",
+    "alert_no_valid_path.wav",
+)
+CONST_PANIC_CLIPS = ("initialization_failed.wav", "halt_assertion_failure.wav")
 
 #
 #
@@ -223,9 +263,19 @@ CONFIG_DEBUG = (
     False  # Defines if we are in a debug build. More logging functionality will be enabled if we are, but this
 )          # may come at the cost of slowing down the program due to the instrumentation
 
+CONFIG_PROFILE = CONFIG_DEBUG # Time the hot paths (see SpanStats). X on the controller shows a summary on the
+                              # screen, and Y saves all of it to CONFIG_PROFILE_FILE on the SD card
+CONFIG_PROFILE_FILE = "profile.txt"
+
 # --------------- CUSTOM VARS ---------------
 CONFIG_DIST_TO_HOUSE_FROM_CORNER = 14 # inches
 CONFIG_DIST_SENSOR_AT_HOUSE = 9 # inches
+CONFIG_DIST_SENSOR_MAX_IN = 78 # The distance sensor can't see further than this (~2m), so anything more is no reading
+CONFIG_APPROACH_KP = 5 # The final approach slows down by this many percent per inch left, once it's close
+CONFIG_APPROACH_MIN_VEL_PCT = 5 # and never goes slower than this
+CONFIG_APPROACH_BAD_READINGS = 5 # After this many distance sensor readings in a row that are out of range, the
+                                 # final approach stops trusting it and just drives the location's final_len
+CONFIG_APPROACH_TIMEOUT_MS = 5000 # Give up on a final approach that hasn't arrived after this long
 
 # --------------- MAP ---------------
 
@@ -274,6 +324,24 @@ CONFIG_ROUTE = [
     CONFIG_WAREHOUSE,
 ]
 
+CONFIG_ANY_ANGLE = False # Cut corners: drive straight lines between the corners of a path wherever nothing is
+                         # in the way, instead of following it along the grid (see any_angle_waypoints)
+CONFIG_ANY_ANGLE_CLEARANCE = 1.0 # How close, in tiles, those lines may pass to an untraversable tile. Grid paths
+                                 # already come this close, going along the tiles next to one
+CONFIG_INCREMENTAL_REPLAN = True # Replan legs mid-mission with an IncrementalPlanner that is kept
+                                 # around, so replanning the same leg again only repairs the last plan
+CONFIG_HPA_MIN_TILES = 64 * 64 # Maps with at least this many tiles are planned hierarchically (see
+                               # HierarchicalPlanner) rather than with one big search
+CONFIG_HPA_CLUSTER_SIZE = 16 # Side length, in tiles, of the clusters the hierarchical planner uses
+CONFIG_PATH_CACHE_MAX_SEGMENTS = 256 # How many path segments, across all cached paths, we keep
+                                    # around before evicting the least recently used ones.
+                                    # Each segment is a small list, so ~32 bytes of heap apiece
+
+CONFIG_ROUTE_OPTIMIZE = True # Reorder the houses between warehouse trips to cut total drive cost.
+                             # Warehouse trips themselves always stay where they are in the route
+CONFIG_ROUTE_OPT_EXACT_MAX = 8 # Up to this many houses between warehouse trips are ordered exactly,
+                               # past that we settle for a (very good) heuristic ordering
+
 # --------------- ROBOT INIT STATE ---------------
 
 CONFIG_ROBOT_START_POS = (6, 2) # Tuple to indicate software-perceived start pos
@@ -289,21 +357,62 @@ CONFIG_ROBOT_START_ORIENTATION = 0.0 # direction robot is facing at start,
 CONFIG_PRINT_LOG_DEPTH = 0 # The deepest log we should still print
                            # e.g. setting this to 2 will print 
                            # ERR and WARN but not DEBUG or TRACE
+CONFIG_LOG_RING_SIZE = 128 # How many log records a debug build keeps around, the oldest ones
+                           # get overwritten (see LogRing). Left on the controller shows them on the screen
+CONFIG_LOG_FILE = "log.txt" # Where on the SD card `drain_logs_to_sd` appends logs to
 
 CONFIG_FONT = FontType.PROP20 
 
 # --------------- LOCOMOTION ---------------  
-CONFIG_TURN_COST = 5 # Used in A*, tunable
-CONFIG_TURN_ITERS = 3 # How many extra times after an initial turn do we check again?
+CONFIG_TURN_COST = 5 # Used in A* when CONFIG_TIME_COSTS is off, in tiles per turn, tunable
+CONFIG_TIME_COSTS = True # Plan the fastest path in milliseconds of driving (see PlanCosts), rather than the one
+                         # with the least tile weight plus CONFIG_TURN_COST per turn
+CONFIG_TIME_TILE_MS = 240 # How long driving takes until the robot has timed enough of its own (see
+CONFIG_TIME_RUN_MS = 460 # MotionTelemetry): each tile of a straight run, plus this per run to speed up and
+CONFIG_TIME_TURN_MS = 145 # slow down, and a turn on the spot takes this plus
+CONFIG_TIME_TURN_MS_PER_DEG = 5.2 # this per degree. Measured at the default speeds below
+CONFIG_TIME_MIN_SAMPLES = 8 # How many runs (and turns) have to be timed before their own fit is used
+CONFIG_TIME_MAX_SAMPLES = 200 # Past this many, older samples count for half, so the fit keeps up with the robot
+CONFIG_TIME_FILE = "motion.txt" # Where on the SD card the timings are kept from one run to the next
+CONFIG_ASTAR_INDEXED_HEAP = True # Use IndexedHeap (decrease-key) for A*'s open set. When False,
+                                 # fall back to the plain heapq that keeps stale duplicates around
+CONFIG_ASTAR_FLAT_HEAP_MAX_STATES = 4096 # Maps with up to this many (tile, heading) states keep one
+                                         # FlatIndexedHeap around for A*. That's an array("d") and an
+                                         # array("l") entry a state: 8 + 4 = 12 bytes on the brain's
+                                         # (32 bit) MicroPython, so 30KB for a 24x24 map, and 8 + 8 = 16
+                                         # bytes on 64 bit CPython. Bigger maps use dicts, for what a
+                                         # search touches
 CONFIG_TURN_ERROR_MARGIN = 2 # How much difference until we turn?
+CONFIG_TURN_KP = 4 # PD gains for turning on the spot, in percent of motor speed per degree off,
+CONFIG_TURN_KD = 0.1 # and per degree per second we're turning at
+CONFIG_TURN_MIN_VEL_PCT = 10 # A turn never drives the motors slower than this until it's within half the margin,
+                            # or it would stall just short of it
+CONFIG_TURN_SLEW_PCT = 10 # How much a turn's speed may change from one drive loop tick to the next
+CONFIG_TURN_SETTLE_DPS = 5 # A turn is done once it's within the margin and turning slower than this
+CONFIG_TURN_TIMEOUT_MS = 3000 # Give up on a turn that still hasn't settled after this long
 
 CONFIG_AUDIO_DIR = "" # only if the audio on the microSD is under some directory
 CONFIG_SOUND_VOL = 100 # Range 0-100
+CONFIG_AUDIO_POLL_MS = 50 # Longest the audio thread sleeps while a clip plays, as something else may cut it off
+CONFIG_AUDIO_ANNOUNCE_STALE_MS = 5000 # An announcement (i.e. where we're headed) that hasn't started playing
+                                      # after this long is out of date, and gets dropped (see AudioScheduler)
 
 CONFIG_SPIN_LATENCY_MS = 5 # Spinning/waiting in a loop - how long should we wait each iteration?
+CONFIG_DRIVE_LOOP_PERIOD_MS = 10 # How often the heading correction in `move_by_tiles` runs. The motors and
+                                 # the inertial sensor only report back every 10ms, so faster gains nothing
+CONFIG_DRIVE_CMD_THRESHOLD_PCT = 1 # Motors only get a new velocity once it's this far off the last one sent
 
 CONFIG_ADJUSTMENT_INCHES = 6 # How many inches do we move when adjusting?
 CONFIG_ROBOT_DRIVE_VEL_PCT = 30
+CONFIG_ROBOT_CRUISE_VEL_PCT = 60 # Top speed of a straight run in `move_by_tiles`, which ramps up to it and
+                                 # back down again (see profile_velocity)
+CONFIG_ROBOT_MIN_VEL_PCT = 10 # What a straight run starts off at, and slows down to by the end
+CONFIG_DRIVE_ACCEL_INCHES = 4 # How far a straight run takes to speed up from the minimum to cruising,
+CONFIG_DRIVE_DECEL_INCHES = 6 # and to slow back down again
+CONFIG_HEADING_KP = 1.0 # PID gains for holding a heading on a straight run, in percent of motor speed
+CONFIG_HEADING_KI = 0.5 # per degree off (per degree second for I, per degree per second for D)
+CONFIG_HEADING_KD = 0.05
+CONFIG_HEADING_I_LIMIT = 10 # The most the I term can add, in percent
 CONFIG_ROBOT_TURN_VEL_PCT = 50
 CONFIG_ROBOT_FINAL_VEL_PCT = 30 # Final turn towards a location
 CONFIG_DELIVER_MOTOR_SPIN_DEG = 90
@@ -380,6 +489,217 @@ class heapq:
     def __bool__(self):
         return len(self.data) > 0
 
+# `heapq` with the same push/pop interface as `IndexedHeap`, so the planner can use either.
+# This keeps every (priority, item) push, stale ones included, like the planner always has.
+class TupleHeap(heapq):
+    def __init__(self):
+        super().__init__()
+        self.pushes = 0
+        self.peak = 0
+
+    def push(self, item, priority):
+        self.heappush((priority, item))
+        self.pushes += 1
+        if len(self.data) > self.peak:
+            self.peak = len(self.data)
+
+    def pop(self):
+        return self.heappop()[1]
+
+    def __len__(self):
+        return len(self.data)
+
+# A binary heap of integer items (i.e. planner states) with decrease-key.
+#
+# Every item is in the heap at most once, so pushing an item that is already queued just
+# moves it up to its new priority instead of leaving a stale copy behind. The heap itself
+# only holds ints, but each newly queued item does take an entry in the priority and position
+# dicts (see FlatIndexedHeap for one that doesn't).
+# Ties are broken by the smaller item, same as comparing (priority, item) tuples would.
+class IndexedHeap:
+    def __init__(self):
+        self.data = [] # items
+        self.priority = {} # item -> priority, while queued
+        self.position = {} # item -> index into self.data, while queued
+        self.pushes = 0
+        self.peak = 0
+
+    def __contains__(self, item):
+        return item in self.position
+
+    def peek(self):
+        return self.data[0]
+
+    def top_priority(self):
+        return self.priority[self.data[0]]
+
+    # Like `push`, but the priority may also go up
+    def update(self, item, priority):
+        idx = self.position.get(item)
+        if idx is None or priority <= self.priority[item]:
+            self.push(item, priority)
+            return
+
+        self.priority[item] = priority
+        self._siftdown(idx)
+
+    def remove(self, item):
+        idx = self.position.pop(item)
+        del self.priority[item]
+        last = self.data.pop()
+        if idx < len(self.data):
+            self.data[idx] = last
+            self.position[last] = idx
+            self._siftdown(idx)
+            self._siftup(self.position[last])
+
+    def push(self, item, priority):
+        self.pushes += 1
+        idx = self.position.get(item)
+        if idx is None:
+            idx = len(self.data)
+            self.data.append(item)
+            self.position[item] = idx
+            if idx + 1 > self.peak:
+                self.peak = idx + 1
+        elif priority >= self.priority[item]:
+            return # never raise a priority, A* only ever lowers them
+
+        self.priority[item] = priority
+        self._siftup(idx)
+
+    def pop(self):
+        if len(self.data) == 0:
+            panic("pop from empty heap")
+        root = self.data[0]
+        last = self.data.pop()
+        del self.position[root]
+        del self.priority[root]
+        if len(self.data) > 0:
+            self.data[0] = last
+            self.position[last] = 0
+            self._siftdown(0)
+        return root
+
+    def _siftup(self, idx):
+        data = self.data
+        item = data[idx]
+        item_priority = self.priority[item]
+        while idx > 0:
+            parent = (idx - 1) // 2
+            parent_item = data[parent]
+            parent_priority = self.priority[parent_item]
+            if parent_priority < item_priority or (parent_priority == item_priority and parent_item < item):
+                break
+            data[idx] = parent_item
+            self.position[parent_item] = idx
+            idx = parent
+        data[idx] = item
+        self.position[item] = idx
+
+    def _siftdown(self, idx):
+        data = self.data
+        priority = self.priority
+        n = len(data)
+        item = data[idx]
+        item_priority = priority[item]
+        while True:
+            child = 2 * idx + 1
+            if child >= n:
+                break
+            child_item = data[child]
+            child_priority = priority[child_item]
+            right = child + 1
+            if right < n:
+                right_item = data[right]
+                right_priority = priority[right_item]
+                if right_priority < child_priority or (right_priority == child_priority and right_item < child_item):
+                    child = right
+                    child_item = right_item
+                    child_priority = right_priority
+            if item_priority < child_priority or (item_priority == child_priority and item < child_item):
+                break
+            data[idx] = child_item
+            self.position[child_item] = idx
+            idx = child
+        data[idx] = item
+        self.position[item] = idx
+
+    def __bool__(self):
+        return len(self.data) > 0
+
+    def __len__(self):
+        return len(self.data)
+
+# An IndexedHeap for items that are all in range(capacity), i.e. A*'s `index * 4 + heading`
+# states, keeping positions and priorities in flat arrays indexed by item instead of dicts. The
+# arrays are allocated once and reused from one search to the next (see `astar_open_heap`), so a
+# push allocates nothing at all, besides growing the list of queued items.
+class FlatIndexedHeap(IndexedHeap):
+    def __init__(self, capacity):
+        IndexedHeap.__init__(self)
+        self.capacity = capacity
+        self.priority = array("d", [0.0] * capacity)
+        self.position = array("l", [-1] * capacity)
+        self.busy = False
+
+    # Empties the heap for the next search, only touching what's still queued
+    def reset(self):
+        for item in self.data:
+            self.position[item] = -1
+        self.data = []
+        self.pushes = 0
+        self.peak = 0
+
+    def __contains__(self, item):
+        return self.position[item] >= 0
+
+    def update(self, item, priority):
+        idx = self.position[item]
+        if idx < 0 or priority <= self.priority[item]:
+            self.push(item, priority)
+            return
+
+        self.priority[item] = priority
+        self._siftdown(idx)
+
+    def remove(self, item):
+        idx = self.position[item]
+        self.position[item] = -1
+        last = self.data.pop()
+        if idx < len(self.data):
+            self.data[idx] = last
+            self.position[last] = idx
+            self._siftdown(idx)
+            self._siftup(self.position[last])
+
+    def push(self, item, priority):
+        self.pushes += 1
+        idx = self.position[item]
+        if idx < 0:
+            idx = len(self.data)
+            self.data.append(item)
+            self.position[item] = idx
+            if idx + 1 > self.peak:
+                self.peak = idx + 1
+        elif priority >= self.priority[item]:
+            return # never raise a priority, A* only ever lowers them
+
+        self.priority[item] = priority
+        self._siftup(idx)
+
+    def pop(self):
+        if len(self.data) == 0:
+            panic("pop from empty heap")
+        root = self.data[0]
+        last = self.data.pop()
+        self.position[root] = -1
+        if len(self.data) > 0:
+            self.data[0] = last
+            self.position[last] = 0
+            self._siftdown(0)
+        return root
+
 #
 #
 # --------- ERROR HANDLING, AUDIO, AND INIT CODE ---------
@@ -415,6 +735,12 @@ class PanicReason(FakeIntEnum):
 
     PANIC_INTERNAL_INVARIANT = 100
 
+class AudioPriority(FakeIntEnum):
+    AUDIO_STATUS = 0  # Chimes about what we're up to, i.e. "continuing"
+    AUDIO_ANNOUNCE = 1  # Where we're headed next
+    AUDIO_ALERT = 2  # Something went wrong, but we carry on. Cuts off anything less important
+    AUDIO_PANIC = 3  # Something went very wrong
+
 class PanicCallback:
     def __init__(
         self,
@@ -437,30 +763,249 @@ def init_advance(stage):
 def spin_wait():
     wait(CONFIG_SPIN_LATENCY_MS, MSEC)
 
-def play_audio(fname, blocking=True):
-    if fname is None:
-        return
+class AudioClip:
+    def __init__(self, path, duration_ms):
+        self.path = path # as passed to brain.play_file, CONFIG_AUDIO_DIR and all
+        self.duration_ms = duration_ms # 0 if we couldn't tell
+
+# Little endian unsigned 32 bit int at `offset` in `data`
+def le32(data, offset):
+    return data[offset] | (data[offset + 1] << 8) | (data[offset + 2] << 16) | (data[offset + 3] << 24)
+
+# How long the WAV file `path` plays for, from the "fmt " and "data" chunks in its header.
+# Returns 0 for anything that doesn't look like a WAV file.
+def wav_duration_ms(path, size):
+    header = brain.sdcard.loadfile(path, bytearray(CONST_WAV_HEADER_BYTES))
+    if len(header) < 12 or bytes(header[0:4]) != b"RIFF" or bytes(header[8:12]) != b"WAVE":
+        return 0
+
+    byte_rate = 0
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk = bytes(header[offset:offset + 4])
+        chunk_size = le32(header, offset + 4)
+        if chunk == b"fmt " and offset + 20 <= len(header):
+            byte_rate = le32(header, offset + 16)
+        elif chunk == b"data":
+            break
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+    if byte_rate <= 0:
+        return 0
+    # the data runs to the end of the file, near enough, so its own size isn't even needed
+    return max(size - offset - 8, 0) * 1000 // byte_rate
+
+# Which clips are on the SD card, under what path, and how long they are. Every clip costs
+# us one (slow, FAT) lookup, and reading its header, the first time it's asked about and never
+# again, so the ones we know we'll need are all looked up at init (see check_audio).
+class AudioManifest:
+    def __init__(self):
+        self.clips = {} # file name -> AudioClip, or None if it's not there
 
-    if CONFIG_AUDIO_DIR != "":
-        raw_path = CONFIG_AUDIO_DIR + "/" + fname
-    else:
-        raw_path = fname
+    def lookup(self, fname):
+        if fname in self.clips:
+            return self.clips[fname]
+
+        if CONFIG_AUDIO_DIR != "":
+            raw_path = CONFIG_AUDIO_DIR + "/" + fname
+        else:
+            raw_path = fname
+
+        clip = None
+        if brain.sdcard.is_inserted() and brain.sdcard.exists(raw_path):
+            clip = AudioClip(raw_path, wav_duration_ms(raw_path, brain.sdcard.filesize(raw_path)))
+        self.clips[fname] = clip
+        return clip
+
+    def summary(self):
+        found = 0
+        total_ms = 0
+        for clip in self.clips.values():
+            if clip is not None:
+                found += 1
+                total_ms += clip.duration_ms
+        return "%d/%d clips, %d ms of audio" % (found, len(self.clips), total_ms)
+
+_AUDIO_MANIFEST = AudioManifest()
+
+# Looks up every clip the program might play, so that none of that happens while driving, and
+# warns about the ones that are missing. Those just don't play, which is easy to miss until
+# the one time it mattered.
+def check_audio():
+    missing = []
+    for fname in CONST_AUDIO_CLIPS + CONST_PANIC_CLIPS:
+        if _AUDIO_MANIFEST.lookup(fname) is None:
+            missing.append(fname)
+    for location in ROUTE:
+        if location.audio_file is not None and _AUDIO_MANIFEST.lookup(location.audio_file) is None:
+            missing.append(location.audio_file)
+
+    for fname in missing:
+        if fname in CONST_PANIC_CLIPS:
+            log_event(LogType.LOG_WARN, "audio: %s is missing, panics will be silent", fname)
+        else:
+            log_event(LogType.LOG_WARN, "audio: %s is missing", fname)
+    if log_enabled(LogType.LOG_DEBUG):
+        log_event(LogType.LOG_DEBUG, "audio: %s", _AUDIO_MANIFEST.summary())
+    return missing
+
+# One thing to say: one or more clips, played back to back
+class AudioRequest:
+    QUEUED = 0
+    PLAYING = 1
+    DONE = 2 # played all the way through
+    DROPPED = 3 # never played, or cut off, as something else was more important
+
+    def __init__(self, clips, priority, key, expires, seq):
+        self.clips = clips
+        self.priority = priority
+        self.key = key # a newer request with the same key replaces this one, if it hasn't started yet
+        self.expires = expires # get_time_ms() after which it's not worth starting any more, or None
+        self.seq = seq
+        self.state = AudioRequest.QUEUED
+
+    def done(self):
+        return self.state >= AudioRequest.DONE
+
+    # Blocks until this has been played (or dropped)
+    def wait(self):
+        while not self.done():
+            if _AUDIO.thread is None:
+                _AUDIO.step() # nobody else is going to
+            spin_wait()
+
+# Plays audio on its own thread, so that the robot doesn't have to stand still while it talks.
+#
+# Requests are queued by priority, and in the order they came in within one. An alert (or a
+# panic) cuts off whatever less important clip is playing, while anything else waits its turn.
+# Requests with a key coalesce: queuing one drops any still queued with the same key, and cuts
+# off a less important one with it that's already playing, so we never read out what we were up
+# to a leg ago. Everything about the mission's progress goes under the "progress" key. Requests
+# can also expire, for when an alert held them up.
+#
+# The brain only plays one clip at a time, and doesn't tell us when one is done. We know how
+# long each clip is though (see AudioManifest), so the thread only starts polling
+# `sound_is_active` once the one playing is due to be done.
+class AudioScheduler:
+    def __init__(self):
+        self.queue = []
+        self.current = None
+        self.clip = 0 # index into current.clips
+        self.clip_ends = 0 # get_time_ms() the clip playing should be done by, going by its length
+        self.seq = 0
+        self.thread = None
+        self.played = 0
+        self.dropped = 0
+        self.preempted = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = Thread(self.run)
 
-    if brain.sdcard.exists(raw_path):
+    def run(self):
+        while True:
+            self.step()
+            # no need to look again before the clip that's playing is due to finish
+            remaining = self.clip_ends - get_time_ms() if self.current is not None else 0
+            wait(max(min(remaining, CONFIG_AUDIO_POLL_MS), CONFIG_SPIN_LATENCY_MS), MSEC)
+
+    def summary(self):
+        return "%d played, %d dropped, %d cut off" % (self.played, self.dropped, self.preempted)
+
+    def enqueue(self, clips, priority, key = None, max_age_ms = None):
+        if key is not None:
+            kept = []
+            for request in self.queue:
+                if request.key == key:
+                    request.state = AudioRequest.DROPPED
+                    self.dropped += 1
+                else:
+                    kept.append(request)
+            self.queue = kept
+
+        expires = None if max_age_ms is None else get_time_ms() + max_age_ms
+        request = AudioRequest(clips, priority, key, expires, self.seq)
+        self.seq += 1
+
+        i = len(self.queue)
+        while i > 0 and self.queue[i - 1].priority < priority:
+            i -= 1
+        self.queue.insert(i, request)
+
+        current = self.current
+        if current is not None and current.priority < priority and (
+                priority >= AudioPriority.AUDIO_ALERT or (key is not None and current.key == key)):
+            brain.sound_off()
+            current.state = AudioRequest.DROPPED
+            self.current = None
+            self.preempted += 1
+            self.step()
+        return request
+
+    # Moves things along: starts the next clip once the last one is done
+    def step(self):
+        if self.current is not None and (get_time_ms() < self.clip_ends or brain.sound_is_active()):
+            return
+
+        while True:
+            if self.current is not None:
+                self.clip += 1
+                if self.clip >= len(self.current.clips):
+                    self.current.state = AudioRequest.DONE
+                    self.current = None
+                    self.played += 1
+
+            if self.current is None:
+                if not self.queue:
+                    return
+                request = self.queue.pop(0)
+                if request.expires is not None and get_time_ms() > request.expires:
+                    log_event(LogType.LOG_DEBUG, "audio: dropped stale %s", request.clips)
+                    request.state = AudioRequest.DROPPED
+                    self.dropped += 1
+                    continue
+                request.state = AudioRequest.PLAYING
+                self.current = request
+                self.clip = 0
+
+            if self._play(self.current.clips[self.clip]):
+                return
+            # missing clips are skipped over, on to the next one
+
+    def _play(self, fname):
+        clip = _AUDIO_MANIFEST.lookup(fname)
+        if clip is None:
+            return False
         if brain.sound_is_active():
             brain.sound_off()
+        brain.play_file(clip.path, CONFIG_SOUND_VOL)
+        self.clip_ends = get_time_ms() + clip.duration_ms
+        return True
 
-        brain.play_file(raw_path, CONFIG_SOUND_VOL)
-        if blocking:
-            while brain.sound_is_active():
-                spin_wait()
+_AUDIO = AudioScheduler()
+
+# Queues `fname` (or a tuple of files, played back to back) up to be played, see AudioScheduler.
+# With `blocking`, waits until it's been played. Returns the AudioRequest, to wait on later.
+def play_audio(fname, blocking = False, priority = AudioPriority.AUDIO_STATUS, key = None, max_age_ms = None):
+    if fname is None:
+        return None
+
+    start = span_begin()
+    if not isinstance(fname, tuple):
+        fname = (fname,)
+    request = _AUDIO.enqueue(fname, priority, key, max_age_ms)
+    if blocking:
+        request.wait()
+
+    span_end(Span.SPAN_AUDIO, start)
+    return request
 
 # NOTE: -- UNUSED FUNCTION -- This was originally intended to be used
 # in debugging, as the robot could "speak" its position on the map,
 # among other data. 
 def speak_number(num):
     def speak_word(word):
-        play_audio("num_" + word + ".wav")
+        play_audio("num_" + word + ".wav", blocking=True)
 
     ones = [ # I know this is silly but this used to convert
              # into english words rather than numbers, (e.g. 0 -> "zero")
@@ -532,6 +1077,9 @@ def speak_number(num):
 def get_time_ms():
     return brain.timer.time(MSEC)
 
+def get_time_us():
+    return brain.timer.system_high_res()
+
 def print_message(msg = ""):
     print(msg)
     brain.screen.print(msg)
@@ -553,7 +1101,7 @@ _PANIC_CALLBACKS = []
 def panic(reason):
     print_message('PANIC "%s"' % (reason))
     if _INIT_STAGE < InitStage.INIT_RUNNING:
-        play_audio("initialization_failed.wav")
+        play_audio("initialization_failed.wav", blocking=True, priority=AudioPriority.AUDIO_PANIC)
 
     callbacks = sorted(
         _PANIC_CALLBACKS,
@@ -579,9 +1127,9 @@ def robo_assert(condition, reason, msg = ""):
     if condition:
         return
 
-    play_audio("halt_assertion_failure.wav") # TODO: maybe someone can find a smarter way 
-                                             # of doing audio files and not making
-                                             # a million CONFIG_*s.... 
+    # TODO: maybe someone can find a smarter way of doing audio files and not making
+    # a million CONFIG_*s....
+    play_audio("halt_assertion_failure.wav", blocking=True, priority=AudioPriority.AUDIO_PANIC)
     panic("%s: %s" % (PanicReason.name(reason), msg))
 
 #
@@ -603,29 +1151,219 @@ class LogType(FakeIntEnum):
     LOG_ERR = 3  # Fatal errors (these do NOT panic, however)
 
 
-_LOGS = []
-class Log:
-    def __init__(self, log_type, message = ""):
-        self.log_type = log_type
-        self.message = message
-        self.timestamp = get_time_ms()
-
-    
-def log_event(log_type, message = ""):
+# Debug builds keep their most recent logs in here. Every record is a slot in arrays that are
+# all allocated up front, and once they're full the oldest record gets overwritten, so a debug
+# build can run for as long as it likes without the logs eating the heap. Records keep a format
+# and its args rather than a message, and are only formatted once they get drained. Args are
+# kept as they are, so a record holds on to whatever it was handed until it's overwritten.
+class LogRing:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.types = bytearray(capacity)
+        self.times = array("l", [0] * capacity) # ms since the program started
+        self.formats = [None] * capacity
+        self.args = [None] * capacity # None, or a tuple for `formats[i] % args[i]`
+        self.head = 0 # slot the next record goes in
+        self.count = 0
+        self.dropped = 0 # records overwritten before anyone drained them
+
+    def push(self, log_type, fmt, args = None):
+        i = self.head
+        self.types[i] = log_type
+        self.times[i] = int(get_time_ms())
+        self.formats[i] = fmt
+        self.args[i] = args
+
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.dropped += 1
+
+    def format(self, i):
+        message = self.formats[i]
+        if self.args[i] is not None:
+            message = message % self.args[i]
+        return "%d %s: %s" % (self.times[i], LogType.name(self.types[i]), message)
+
+    # Hands every record to `out` as a line of text, oldest first, and empties the ring
+    def drain(self, out):
+        if self.dropped:
+            out("(%d older logs dropped)" % self.dropped)
+            self.dropped = 0
+
+        i = (self.head - self.count) % self.capacity
+        while self.count:
+            out(self.format(i))
+            self.formats[i] = None # let go of the args, too
+            self.args[i] = None
+            self.count -= 1
+            i = (i + 1) % self.capacity
+
+_LOG_RING = LogRing(CONFIG_LOG_RING_SIZE) if CONFIG_DEBUG else None
+
+# Whether a `log_type` log goes anywhere at all. Formatting is lazy, but the args are worked out
+# regardless, so check this first before logging anything that takes work to get at.
+def log_enabled(log_type):
+    return CONFIG_DEBUG or log_type >= CONFIG_PRINT_LOG_DEPTH
+
+# Logs `fmt % args`, e.g. log_event(LogType.LOG_TRACE, "Turn to %f", new_orient). The message is
+# only ever formatted if it gets printed (or once the ring is drained), so keep the work out of
+# the args themselves where you can. Release builds don't log TRACE or DEBUG at all, see
+# tools/strip_logs.py
+def log_event(log_type, fmt = "", *args):
     if log_type >= CONFIG_PRINT_LOG_DEPTH:
-        print(LogType.name(log_type) + ": " + message)
+        if args:
+            print(LogType.name(log_type) + ": " + fmt % args)
+        else:
+            print(LogType.name(log_type) + ": " + fmt)
+
+    if CONFIG_DEBUG:
+        _LOG_RING.push(log_type, fmt, args or None)
 
+# Shows the logs kept so far on the brain's screen (and takes them out of the ring, so they
+# won't end up on the SD card too)
+def drain_logs_to_screen():
     if CONFIG_DEBUG:
-        _LOGS.append(Log(log_type, message))
+        _LOG_RING.drain(print_message)
+
+# Appends the logs to CONFIG_LOG_FILE, a few lines at a time, as every write to the SD card
+# costs us a good deal more than the text itself does
+def drain_logs_to_sd(fname = CONFIG_LOG_FILE):
+    if not CONFIG_DEBUG or not brain.sdcard.is_inserted():
+        return
+
+    lines = []
+    def flush():
+        if lines:
+            brain.sdcard.appendfile(fname, bytearray(("\n".join(lines) + "\n").encode()))
+            del lines[:]
+
+    def out(line):
+        lines.append(line)
+        if len(lines) >= 16:
+            flush()
+
+    _LOG_RING.drain(out)
+    flush()
+
+# What gets timed (with `span_begin`/`span_end`), when CONFIG_PROFILE is on
+class Span(FakeIntEnum):
+    SPAN_ASTAR = 0  # One `astar_internal` search
+    SPAN_TURN = 1  # `Robot.turn`, with its retries and settling wait
+    SPAN_MOVE_ITER = 2  # One time around `move_by_tiles`'s loop, wait included, so the loop's period
+                        # (ControlLoop keeps its own jitter and overrun counts)
+    SPAN_AUDIO = 3  # `play_audio`, and how long the clip took too if it was asked to block
+    SPAN_FOLLOW_PATH = 4  # `Robot.follow_path`
+    SPAN_LEG = 5  # A whole `travel_to`
+
+_SPAN_COUNT = 6
+
+# Timings for every Span, in arrays that are allocated up front, so timing something only costs
+# two timer reads and a few array writes. Histogram bucket `b` counts the spans that took under
+# CONST_SPAN_BUCKET_US << b microseconds (and the last bucket everything longer).
+class SpanStats:
+    def __init__(self, count, buckets):
+        self.buckets = buckets
+        self.counts = array("l", [0] * count)
+        self.mins = array("l", [0] * count) # us
+        self.maxs = array("l", [0] * count) # us
+        self.totals = [0] * count # us, a list since these outgrow an array("l") in a long run
+        self.histogram = array("l", [0] * (count * buckets))
+
+    def record(self, span, us):
+        if self.counts[span] == 0 or us < self.mins[span]:
+            self.mins[span] = us
+        if us > self.maxs[span]:
+            self.maxs[span] = us
+        self.counts[span] += 1
+        self.totals[span] += us
+
+        bucket = 0
+        bound = CONST_SPAN_BUCKET_US
+        while us >= bound and bucket < self.buckets - 1:
+            bucket += 1
+            bound <<= 1
+        self.histogram[span * self.buckets + bucket] += 1
+
+    # Short enough to fit on the brain's screen
+    def summary(self, span):
+        count = self.counts[span]
+        if count == 0:
+            return "%s -" % Span.name(span)[5:]
+        return "%s %dx avg %.1f max %.1f ms" % (
+            Span.name(span)[5:], count, self.totals[span] / count / 1000, self.maxs[span] / 1000)
+
+    def report(self, span):
+        lines = [self.summary(span)]
+        count = self.counts[span]
+        if count == 0:
+            return lines
+
+        lines.append("  min %.3f ms, total %.1f ms" % (self.mins[span] / 1000, self.totals[span] / 1000))
+        buckets = []
+        for b in range(self.buckets):
+            hits = self.histogram[span * self.buckets + b]
+            if hits == 0:
+                continue
+            if b == self.buckets - 1:
+                buckets.append(">=%gms:%d" % ((CONST_SPAN_BUCKET_US << (b - 1)) / 1000, hits))
+            else:
+                buckets.append("<%gms:%d" % ((CONST_SPAN_BUCKET_US << b) / 1000, hits))
+        lines.append("  " + " ".join(buckets))
+        return lines
+
+_SPANS = SpanStats(_SPAN_COUNT, CONST_SPAN_BUCKETS) if CONFIG_PROFILE else None
+
+# start = span_begin()
+# ...
+# span_end(Span.SPAN_TURN, start)
+def span_begin():
+    if CONFIG_PROFILE:
+        return get_time_us()
+    return 0
 
+def span_end(span, start):
+    if CONFIG_PROFILE:
+        _SPANS.record(span, get_time_us() - start)
 
-# A "Tile" structure, this has a weight, which we define with __slots__
-# because there will be a LOT of these, and this is the only thing that a tile has.
+# The summary page, under the position readout that `robot_render_pos` keeps on row 1
+def show_profile():
+    if not CONFIG_PROFILE:
+        return
+
+    brain.screen.clear_screen()
+    brain.screen.set_cursor(2, 1)
+    for span in range(_SPAN_COUNT):
+        print_message(_SPANS.summary(span))
+
+def dump_profile(fname = CONFIG_PROFILE_FILE):
+    if not CONFIG_PROFILE or not brain.sdcard.is_inserted():
+        return
+
+    lines = ["profile at %d ms" % get_time_ms()]
+    for span in range(_SPAN_COUNT):
+        lines.extend(_SPANS.report(span))
+    brain.sdcard.appendfile(fname, bytearray(("\n".join(lines) + "\n").encode()))
+
+
+# A "Tile" is a view of a single cell of a `GridMap`. The weights themselves live in the
+# map's flat array, so a Tile only remembers where to look. These are created on demand
+# (and thrown away right after), rather than one being allocated per cell of the map.
 class Tile:
-    __slots__ = ("weight")
+    __slots__ = ("grid", "index")
+
+    def __init__(self, grid, index):
+        self.grid = grid
+        self.index = index
+
+    @property
+    def weight(self):
+        return self.grid.weights[self.index]
 
-    def __init__(self, weight):
-        self.weight = weight
+    @weight.setter
+    def weight(self, weight):
+        self.grid.set_weight_index(self.index, weight)
 
     # Negative weights are completely untraversable
     @property
@@ -636,20 +1374,42 @@ class Tile:
     def cost(self):
         return self.weight
 
-def find_orient(cur, next_pos):
-    if cur[0] == next_pos[0]:
-        if next_pos[1] > cur[1]:
-            return 0
-        return 180
-    if cur[1] == next_pos[1]:
-        if next_pos[0] > cur[0]:
-            return 90
-        return 270
-
-    robo_assert(False, PanicReason.PANIC_PATH_INVALID, "path points are further than one apart")
-    return 0
+# Grid headings, numbered clockwise from north so that (heading + 2) & 3 is the opposite one.
+# These also double as the bit positions in `GridMap.links`
+HEADING_NORTH = 0
+HEADING_EAST = 1
+HEADING_SOUTH = 2
+HEADING_WEST = 3
+
+_HEADINGS = (HEADING_NORTH, HEADING_EAST, HEADING_SOUTH, HEADING_WEST)
+# Order in which the planner tries neighbors. This decides which of several equally good
+# paths wins, so it is kept as the east, west, north, south order we have always driven
+_EXPAND_ORDER = (HEADING_EAST, HEADING_WEST, HEADING_NORTH, HEADING_SOUTH)
+_HEADING_BITS = (1, 2, 4, 8)
+_HEADING_DEGREES = (0, 90, 180, 270)
+_HEADING_STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0)) # (dx, dy) of one step
+
+# Signed difference between two angles in degrees, in the range [-180, 180)
+def angle_delta(target, current):
+    return ((target - current + 180) % 360) - 180
+
+# Snaps an absolute orientation in degrees (e.g. from the inertial sensor) to the nearest heading
+def heading_of_degrees(degrees):
+    return int(((degrees % 360) + 45) // 90) & 3
 
 # A "GridMap" structure to represent all the Tiles of the map
+#
+# The weights are stored in one contiguous signed byte array, indexed as y * stride + x.
+# Anything that runs often (i.e. the planner) should work on these integer indices directly,
+# as an int doesn't allocate on the heap like a coordinate tuple does.
+#
+# Next to the weights we keep `links`, a 4-bit mask per tile of which neighbors can be stepped
+# to (bit N is set if moving in heading N stays on the map and lands on a traversable tile).
+# This is kept up to date by `set_weight_index`, so it must be the only way weights change.
+#
+# `version` counts changes to the weights, so anything derived from the map (i.e. cached
+# paths) can tell when it has gone stale. Anything that needs to know exactly which tiles
+# changed can add itself to `listeners`, which are called with the index of each changed tile.
 class GridMap:
     def __init__(self, width, height):
         robo_assert(
@@ -660,34 +1420,94 @@ class GridMap:
         self.width = width
         self.height = height
 
-        # indexed as [y][x], or [row][col]
-        self.tiles = [
-            [Tile(1) for _ in range(width + 1)] for _ in range(height + 1)
-        ]
+        # Coordinates are inclusive of both walls, hence the + 1s
+        self.stride = width + 1
+        self.size = self.stride * (height + 1)
+
+        # indexed as [y * stride + x], or [row * stride + col]
+        self.weights = array("b", b"\x01" * self.size)
+        self.version = 0
+        self.listeners = []
+
+        # index offset of one step in each heading
+        self.offsets = (self.stride, 1, -self.stride, -1)
+
+        # Every tile starts out traversable, so only the edges of the map need masking off
+        self.links = bytearray(b"\x0f" * self.size)
+        for x in range(self.stride):
+            self.links[x] &= ~_HEADING_BITS[HEADING_SOUTH]
+            self.links[self.size - self.stride + x] &= ~_HEADING_BITS[HEADING_NORTH]
+        for y in range(height + 1):
+            self.links[y * self.stride] &= ~_HEADING_BITS[HEADING_WEST]
+            self.links[y * self.stride + width] &= ~_HEADING_BITS[HEADING_EAST]
 
     def in_bounds(self, coord):
         x, y = coord
         return 0 <= x <= self.width and 0 <= y <= self.height
 
-    def tile(self, coord):
+    def index(self, coord):
         x, y = coord
-        return self.tiles[y][x]
+        return y * self.stride + x
 
-    def neighbors(self, coord): # capture neighbors for this coordinate
-        x, y = coord
-        candidates = [
-            (x + 1, y),  # eastern one
-            (x - 1, y),  # western one
-            (x, y + 1),  # northern one
-            (x, y - 1),  # southern one
-        ]
+    def coord_of(self, index):
+        return (index % self.stride, index // self.stride)
 
-        result = []
-        for c in candidates:
-            if self.in_bounds(c) and self.tile(c).traversable:
-                result.append(c)
+    def tile(self, coord):
+        return Tile(self, self.index(coord))
 
-        return result
+    def weight_at(self, index):
+        return self.weights[index]
+
+    # A `transient` change is one the caller undoes before anything else looks at the map
+    # (i.e. the planner opening up a house to path into it), so it isn't a new version of it
+    def set_weight_index(self, index, weight, transient = False):
+        robo_assert(
+            CONST_WEIGHT_MIN <= weight <= CONST_WEIGHT_MAX,
+            PanicReason.PANIC_MAP_CORRUPT,
+            "tile weight out of range: %d" % weight,
+        )
+        if self.weights[index] == weight:
+            return
+
+        was_traversable = self.weights[index] >= 0
+        self.weights[index] = weight
+
+        # Our neighbors' links pointing back at us are the only ones that change.
+        # Our own links only depend on our neighbors, so those stay as they are.
+        if was_traversable != (weight >= 0):
+            for heading in _HEADINGS:
+                if self.step_in_bounds(index, heading):
+                    neighbor = index + self.offsets[heading]
+                    back_bit = _HEADING_BITS[(heading + 2) & 3]
+                    if weight >= 0:
+                        self.links[neighbor] |= back_bit
+                    else:
+                        self.links[neighbor] &= ~back_bit
+
+        if not transient:
+            self.version += 1
+            for listener in self.listeners:
+                listener(index)
+
+    def set_weight(self, coord, weight):
+        self.set_weight_index(self.index(coord), weight)
+
+    # Whether one step in `heading` from `index` is still on the map, traversable or not
+    def step_in_bounds(self, index, heading):
+        if heading == HEADING_NORTH:
+            return index + self.stride < self.size
+        if heading == HEADING_SOUTH:
+            return index >= self.stride
+        if heading == HEADING_EAST:
+            return index % self.stride < self.width
+        return index % self.stride > 0
+
+    def neighbor_indices(self, index): # capture traversable neighbors for this index
+        links = self.links[index]
+        return [index + self.offsets[h] for h in _EXPAND_ORDER if links & _HEADING_BITS[h]]
+
+    def neighbors(self, coord): # capture neighbors for this coordinate
+        return [self.coord_of(n) for n in self.neighbor_indices(self.index(coord))]
 
 def print_grid(grid, path=None):
     path_set = set(path) if path else set()
@@ -696,12 +1516,12 @@ def print_grid(grid, path=None):
         row = ""
         for x in range(grid.width + 1):
             coord = (x, y)
-            tile = grid.tile(coord)
+            weight = grid.weight_at(grid.index(coord))
             if coord in path_set:
                 row += "P"  # path tile
-            elif not tile.traversable:
+            elif weight < 0:
                 row += "B"  # blocked
-            elif tile.cost > 1:
+            elif weight > 1:
                 row += "E"  # expensive tile
             else:
                 row += "."  # normal tile
@@ -709,13 +1529,15 @@ def print_grid(grid, path=None):
 
 
 ROUTE = [] # List of Locations from CONFIG_ROUTE
+_DELIVERED_ORIENT = 0 # Which way the robot faces once it backs out from a delivery
 class Location:
-    def __init__(self, name, audio_file, coordinate, final_orient, final_len):
+    def __init__(self, name, audio_file, coordinate, final_orient, final_len, is_warehouse = False):
         self.name = name
         self.audio_file = audio_file
         self.coords = coordinate
         self.final_orient = final_orient
         self.final_len = final_len
+        self.is_warehouse = is_warehouse
 
 def parse_locations():
     for location in CONFIG_ROUTE:
@@ -725,33 +1547,101 @@ def parse_locations():
         y = location[3]
         final_orientation = location[4]
         final_len = location[5]
-        lclass = Location(name, audio_file, (x, y), final_orientation, final_len)    
+        lclass = Location(name, audio_file, (x, y), final_orientation, final_len,
+                          location is CONFIG_WAREHOUSE)
         ROUTE.append(lclass)
 
 # No need to use __slots__ here, since these structures aren't as frequently
 # instantiated, and we might end up adding extra properties later on
+#
+# A Path is kept as the tile it starts on, and then the straight runs it's made of,
+# as [heading, tiles] segments. That's all driving it needs, and a lot smaller than a
+# tuple per tile. The tiles themselves are only worked out if something asks for them.
 class Path:
-    def __init__(self, points, final_orient = 0, final_len = 0): 
-        robo_assert(
-            len(points) != 0, PanicReason.PANIC_PATH_INVALID, "path must have points"
-        )
-        self.points = points
+    def __init__(self, start, segments = None, final_orient = 0, final_len = 0):
+        self.start = start
+        self.segments = []
+        self.end = start
+        self.steps = 0 # how many tiles the path moves, i.e. one less than its points
         self.final_orient = final_orient
         self.final_len = final_len
+        self.cost = 0 # planner cost, filled in by the planner
 
-    @property
-    def start(self):
-        return self.points[0]
+        if segments is not None:
+            for heading, tiles in segments:
+                self.extend(heading, tiles)
+
+    # Adds `tiles` steps going `heading` to the end of the path
+    def extend(self, heading, tiles = 1):
+        if self.segments and self.segments[-1][0] == heading:
+            self.segments[-1][1] += tiles
+        else:
+            self.segments.append([heading, tiles])
+
+        step_x, step_y = _HEADING_STEPS[heading]
+        self.end = (self.end[0] + step_x * tiles, self.end[1] + step_y * tiles)
+        self.steps += tiles
+
+    # Adds another path, starting where this one ends, to the end of this one
+    def join(self, other):
+        robo_assert(other.start == self.end, PanicReason.PANIC_PATH_INVALID, "joined paths don't meet")
+        for heading, tiles in other.segments:
+            self.extend(heading, tiles)
+
+    # Paths handed out of the cache get their own final_orient/len, but share the segments,
+    # so a path isn't to be extended once it's been handed out
+    def copy(self):
+        path = Path(self.start, None, self.final_orient, self.final_len)
+        path.segments = self.segments
+        path.end = self.end
+        path.steps = self.steps
+        path.cost = self.cost
+        return path
+
+    # The pieces to drive this path in. A plain Path is just the one piece, see HierarchicalRoute
+    def pieces(self):
+        return [self]
 
     @property
-    def end(self):
-        return self.points[-1]
+    def points(self):
+        return list(self)
 
     def __len__(self):
-        return len(self.points)
+        return self.steps + 1
 
     def __iter__(self):
-        return iter(self.points)
+        x, y = self.start
+        yield (x, y)
+        for heading, tiles in self.segments:
+            step_x, step_y = _HEADING_STEPS[heading]
+            for _ in range(tiles):
+                x += step_x
+                y += step_y
+                yield (x, y)
+
+    def __str__(self):
+        return "%s %s" % (self.start, " ".join(["%s%d" % ("NESW"[h], t) for h, t in self.segments]))
+
+# Builds the Path ending in `state`, by walking a search's `came_from` back to where it
+# started. States are (tile index * 4 + heading), and every state but the first was
+# reached by moving in its heading, so the runs fall right out of the headings.
+def path_from_states(grid, came_from, state):
+    reversed_segments = []
+    heading = -1
+    tiles = 0
+    while state in came_from:
+        if state & 3 != heading:
+            if tiles:
+                reversed_segments.append((heading, tiles))
+            heading = state & 3
+            tiles = 0
+        tiles += 1
+        state = came_from[state]
+    if tiles:
+        reversed_segments.append((heading, tiles))
+
+    reversed_segments.reverse()
+    return Path(grid.coord_of(state >> 2), reversed_segments)
 
 
 # ---------------------- ROBOT STATE MACHINE ----------------------
@@ -819,14 +1709,226 @@ class RobotAdjustment(FakeIntEnum):
     ROBOT_FORWARD = 3
     ROBOT_BACKWARD = 4
 
+# Runs a loop at a fixed rate: `start` it, and then `wait` at the end of every iteration. Each
+# iteration is due a period after the one before it, rather than a period after that one
+# finished, so the time the loop's body takes doesn't slow it down. If an iteration runs past
+# its deadline (an overrun), the next one goes right away, and the deadlines after that count
+# from then, instead of rushing through the ones that were missed.
+#
+# `elapsed_ms` is how long the last iteration actually took, so anything that works out a rate
+# (i.e. a D term) can divide by that rather than `period_ms`, which an overrun would make too short.
+#
+# The stats cover every run since the loop was made, `summary` them for the logs.
+class ControlLoop:
+    def __init__(self, period_ms):
+        self.period_ms = period_ms
+        self.deadline = 0
+        self.last_tick = 0
+        self.elapsed_ms = period_ms
+        self.ticks = 0
+        self.overruns = 0
+        self.jitter_total = 0 # ms, how far each period was off `period_ms`
+        self.jitter_max = 0
+
+    def start(self):
+        self.last_tick = get_time_ms()
+        self.deadline = self.last_tick + self.period_ms
+        self.elapsed_ms = self.period_ms
+
+    def wait(self):
+        now = get_time_ms()
+        if now >= self.deadline:
+            self.overruns += 1
+            self.deadline = now
+        else:
+            wait(self.deadline - now, MSEC)
+            now = get_time_ms()
+
+        self.elapsed_ms = now - self.last_tick
+        jitter = abs(self.elapsed_ms - self.period_ms)
+        self.jitter_total += jitter
+        if jitter > self.jitter_max:
+            self.jitter_max = jitter
+        self.ticks += 1
+
+        self.last_tick = now
+        self.deadline += self.period_ms
+
+    def summary(self):
+        if self.ticks == 0:
+            return "no ticks"
+        return "%d ticks at %dms, jitter avg %.2f max %.2f ms, %d overruns" % (
+            self.ticks, self.period_ms, self.jitter_total / self.ticks, self.jitter_max, self.overruns)
+
+# A motor group that is only sent a new velocity when it is at least CONFIG_DRIVE_CMD_THRESHOLD_PCT
+# off the last one, instead of every time around a control loop. Each command is a message
+# over the smart port, and resending the same one changes nothing.
+class MotorCommand:
+    def __init__(self, group):
+        self.group = group
+        self.velocity = None # last sent, None to make the next `spin` send regardless
+        self.sent = 0
+        self.skipped = 0
+
+    def reset(self):
+        self.velocity = None
+
+    def spin(self, velocity):
+        if self.velocity is not None and abs(velocity - self.velocity) < CONFIG_DRIVE_CMD_THRESHOLD_PCT:
+            self.skipped += 1
+            return
+
+        self.group.spin(FORWARD, velocity, PERCENT)
+        self.velocity = velocity
+        self.sent += 1
+
+# A PID controller, for one error. Each `update` takes how long it has been (in seconds) since the last one
+class PID:
+    def __init__(self, kp, ki, kd, i_limit):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.i_limit = i_limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_error = None
+
+    def update(self, error, dt):
+        self.integral += error * dt
+        # clamp what the I term adds, so it can't wind up while the error can't be fixed anyway
+        if self.ki:
+            limit = self.i_limit / self.ki
+            self.integral = max(-limit, min(limit, self.integral))
+
+        derivative = 0.0
+        if self.last_error is not None:
+            derivative = (error - self.last_error) / dt
+        self.last_error = error
+
+        return self.kp * error + self.ki * self.integral + self.kd * derivative
+
+# The speed (in percent) to be going at `travelled` inches into a straight run of `distance`
+# inches. It's a trapezoid: up from CONFIG_ROBOT_MIN_VEL_PCT over CONFIG_DRIVE_ACCEL_INCHES, along
+# at CONFIG_ROBOT_CRUISE_VEL_PCT, and back down over the last CONFIG_DRIVE_DECEL_INCHES. Runs too
+# short to reach cruising speed just peak where the two ramps meet.
+#
+# Going by distance rather than time means a run that slips or stalls still slows down in
+# the right place.
+def profile_velocity(travelled, distance):
+    span = CONFIG_ROBOT_CRUISE_VEL_PCT - CONFIG_ROBOT_MIN_VEL_PCT
+    up = CONFIG_ROBOT_MIN_VEL_PCT + span * travelled / CONFIG_DRIVE_ACCEL_INCHES
+    down = CONFIG_ROBOT_MIN_VEL_PCT + span * (distance - travelled) / CONFIG_DRIVE_DECEL_INCHES
+    return max(CONFIG_ROBOT_MIN_VEL_PCT, min(CONFIG_ROBOT_CRUISE_VEL_PCT, up, down))
+
+# A least squares line `y = a + b * x` through samples, kept as running sums so it takes the same
+# memory however many it has seen. Once there are more than CONFIG_TIME_MAX_SAMPLES the sums
+# are halved, so older samples count for less and the fit follows the robot as it wears.
+class LineFit:
+    def __init__(self):
+        self.n = 0.0
+        self.sx = 0.0
+        self.sy = 0.0
+        self.sxx = 0.0
+        self.sxy = 0.0
+
+    def add(self, x, y):
+        if self.n >= CONFIG_TIME_MAX_SAMPLES:
+            self.n /= 2
+            self.sx /= 2
+            self.sy /= 2
+            self.sxx /= 2
+            self.sxy /= 2
+        self.n += 1
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.sxy += x * y
+
+    # (a, b), or None if there isn't enough to go on yet (too few samples, or all the same x)
+    def fit(self):
+        if self.n < CONFIG_TIME_MIN_SAMPLES:
+            return None
+        spread = self.n * self.sxx - self.sx * self.sx
+        if spread <= 0.5 * self.n * self.n: # x's standard deviation is under ~0.7
+            return None
+        b = (self.n * self.sxy - self.sx * self.sy) / spread
+        return ((self.sy - b * self.sx) / self.n, b)
+
+    def to_line(self, name):
+        return "%s %f %f %f %f %f" % (name, self.n, self.sx, self.sy, self.sxx, self.sxy)
+
+    def from_fields(self, fields):
+        self.n, self.sx, self.sy, self.sxx, self.sxy = [float(field) for field in fields]
+
+# How long straight runs and turns actually take on this robot, which is what time based plans
+# (see PlanCosts) are made with. Runs are fit by tiles and turns by degrees, so between them we
+# get the time per tile, per degree, and what every run and turn costs on top of that.
+#
+# The sums are loaded from CONFIG_TIME_FILE at init and saved back at the end of the mission, so
+# every run learns from all the ones before it.
+class MotionTelemetry:
+    def __init__(self):
+        self.runs = LineFit() # tiles -> ms
+        self.turns = LineFit() # degrees -> ms
+
+    def record_run(self, tiles, ms):
+        self.runs.add(tiles, ms)
+
+    def record_turn(self, degrees, ms):
+        self.turns.add(degrees, ms)
+
+    def costs(self):
+        run_ms, tile_ms = self.runs.fit() or (CONFIG_TIME_RUN_MS, CONFIG_TIME_TILE_MS)
+        turn_ms, deg_ms = self.turns.fit() or (CONFIG_TIME_TURN_MS, CONFIG_TIME_TURN_MS_PER_DEG)
+        # a noisy fit can come out with a (slightly) negative intercept, which no move really has
+        run_ms = max(run_ms, 0)
+        turn_ms = max(turn_ms, 0)
+        deg_ms = max(deg_ms, 0)
+        return PlanCosts(
+            max(int(tile_ms + 0.5), 1),
+            int(turn_ms + 90 * deg_ms + run_ms + 0.5),
+            int(turn_ms + 180 * deg_ms + run_ms + 0.5),
+            int(turn_ms + 0.5),
+            deg_ms,
+        )
+
+    def load(self, fname = CONFIG_TIME_FILE):
+        if not brain.sdcard.is_inserted() or not brain.sdcard.exists(fname):
+            return
+        for line in bytes(brain.sdcard.loadfile(fname)).decode().split("\n"):
+            fields = line.split()
+            if len(fields) != 6:
+                continue
+            if fields[0] == "runs":
+                self.runs.from_fields(fields[1:])
+            elif fields[0] == "turns":
+                self.turns.from_fields(fields[1:])
+        log_event(LogType.LOG_DEBUG, "motion telemetry: %d runs, %d turns from %s",
+                  self.runs.n, self.turns.n, fname)
+
+    def save(self, fname = CONFIG_TIME_FILE):
+        if not brain.sdcard.is_inserted():
+            return
+        text = self.runs.to_line("runs") + "\n" + self.turns.to_line("turns") + "\n"
+        brain.sdcard.savefile(fname, bytearray(text.encode()))
+
+_TELEMETRY = MotionTelemetry()
+
+_DRIVE_LOOP = ControlLoop(CONFIG_DRIVE_LOOP_PERIOD_MS)
+_HEADING_PID = PID(CONFIG_HEADING_KP, CONFIG_HEADING_KI, CONFIG_HEADING_KD, CONFIG_HEADING_I_LIMIT)
+_LEFT_COMMAND = MotorCommand(left_drive_smart)
+_RIGHT_COMMAND = MotorCommand(right_drive_smart)
+
 class Robot:
     def __init__(self, start):
         self.position = start
         self.state = RobotState.ROBOT_STOPPED
     
     def change_state(self, new_state):
-        log_event(LogType.LOG_TRACE, "Robot state change %s -> %s" 
-                    % (RobotState.name(self.state), RobotState.name(new_state)))
+        log_event(LogType.LOG_TRACE, "Robot state change %s -> %s",
+                  RobotState.name(self.state), RobotState.name(new_state))
         self.state = new_state
 
     def can_step_to(self, target):
@@ -835,24 +1937,66 @@ class Robot:
         return abs(x1 - x2) + abs(y1 - y2) == 1
     
     def turn(self, new_orient):
-        log_event(LogType.LOG_TRACE, "Turn to %f" % new_orient)
+        start = span_begin()
+        log_event(LogType.LOG_TRACE, "Turn to %f", new_orient)
 
-        def angle_delta(target, current):
-            return ((target - current + 180) % 360) - 180
+        if not CONFIG_NOP_MOVES:
+            self._turn_closed_loop(new_orient)
 
-        for i in range(0, CONFIG_TURN_ITERS):
-            orient = brain_inertial.heading(DEGREES)
-            delta = angle_delta(new_orient, orient)
+        log_event(LogType.LOG_TRACE, "Turn completed")
+        span_end(Span.SPAN_TURN, start)
+
+    # Turns on the spot in one go, watching the heading on every drive loop tick, rather than
+    # a blind `turn_for` and then checking how far off it ended up. The speed comes from a PD
+    # on how far off we are, capped at CONFIG_ROBOT_TURN_VEL_PCT and only allowed to change by
+    # CONFIG_TURN_SLEW_PCT a tick, which ramps it up and back down again. We're done once we're
+    # within the margin and have (nearly) stopped turning, so there's no fixed wait to settle.
+    #
+    # How fast we're turning comes from the heading itself, not `gyro_rate`, so the two can't
+    # disagree on sign or units.
+    def _turn_closed_loop(self, new_orient):
+        began = get_time_ms()
+        give_up = began + CONFIG_TURN_TIMEOUT_MS
+        velocity = 0.0
+        orient = brain_inertial.heading(DEGREES)
+        rate = 0.0
+        degrees = abs(angle_delta(new_orient, orient))
+        settled = True
+
+        _LEFT_COMMAND.reset()
+        _RIGHT_COMMAND.reset()
+        _DRIVE_LOOP.start()
 
-            log_event(LogType.LOG_DEBUG, "orient = %f, new_orient = %f, delta = %f" % (orient, new_orient, delta))
-            if abs(delta) < CONFIG_TURN_ERROR_MARGIN:
+        while True:
+            error = angle_delta(new_orient, orient)
+            if abs(error) < CONFIG_TURN_ERROR_MARGIN and abs(rate) < CONFIG_TURN_SETTLE_DPS:
                 break
-            
-            if not CONFIG_NOP_MOVES:
-                drivetrain.turn_for(RIGHT, delta)
-        
-        log_event(LogType.LOG_TRACE, "Turn completed")
-        wait(50, MSEC)
+            if get_time_ms() > give_up:
+                log_event(LogType.LOG_WARN, "Turn to %f gave up %f degrees off", new_orient, error)
+                settled = False
+                break
+
+            target = CONFIG_TURN_KP * error - CONFIG_TURN_KD * rate
+            target = max(-CONFIG_ROBOT_TURN_VEL_PCT, min(CONFIG_ROBOT_TURN_VEL_PCT, target))
+            # once it's well inside the margin it may as well creep in the rest of the way (or stall)
+            if abs(error) >= CONFIG_TURN_ERROR_MARGIN / 2 and abs(target) < CONFIG_TURN_MIN_VEL_PCT:
+                target = CONFIG_TURN_MIN_VEL_PCT if error > 0 else -CONFIG_TURN_MIN_VEL_PCT
+            velocity += max(-CONFIG_TURN_SLEW_PCT, min(CONFIG_TURN_SLEW_PCT, target - velocity))
+
+            # positive is clockwise, i.e. to the right
+            _LEFT_COMMAND.spin(velocity)
+            _RIGHT_COMMAND.spin(-velocity)
+            _DRIVE_LOOP.wait()
+
+            last = orient
+            orient = brain_inertial.heading(DEGREES)
+            rate = angle_delta(orient, last) * 1000 / _DRIVE_LOOP.elapsed_ms
+
+        left_drive_smart.stop()
+        right_drive_smart.stop()
+        if settled and degrees >= CONFIG_TURN_ERROR_MARGIN:
+            _TELEMETRY.record_turn(degrees, get_time_ms() - began)
+        log_event(LogType.LOG_DEBUG, "turned to %f, %f degrees off", orient, angle_delta(new_orient, orient))
     
     def move_by_tiles(self, tiles, angle_to_maintain):
         if CONFIG_NOP_MOVES:
@@ -860,96 +2004,168 @@ class Robot:
 
         wheel_circumference = CONFIG_WHEEL_DIAMETER_IN * math.pi
         travelled_distance = tiles * CONFIG_MAP_TILE_SIDE_INCHES
-
-        expected_rotations = travelled_distance / wheel_circumference
-        expected_degree_change = 360 * expected_rotations
+        degrees_per_inch = 360 / wheel_circumference
 
         left_drive_smart.set_position(0, DEGREES)
         right_drive_smart.set_position(0, DEGREES)
+        began = get_time_ms()
 
-        left_drive_smart.spin(FORWARD)
-        right_drive_smart.spin(FORWARD)
+        # the first time around always starts the motors
+        _LEFT_COMMAND.reset()
+        _RIGHT_COMMAND.reset()
+        _HEADING_PID.reset()
+        _DRIVE_LOOP.start()
 
         # Inspired by team Cyber Sharks
-        while (abs(left_drive_smart.position(DEGREES)) + abs(right_drive_smart.position(DEGREES))) / 2 < expected_degree_change:
+        while True:
+            start = span_begin()
+            travelled = (abs(left_drive_smart.position(DEGREES)) + abs(right_drive_smart.position(DEGREES))) / 2 / degrees_per_inch
+            if travelled >= travelled_distance:
+                break
+
             current_angle = drivetrain.rotation(DEGREES)
-            correction = (angle_to_maintain - current_angle + 180) % 360 - 180
+            error = (angle_to_maintain - current_angle + 180) % 360 - 180
+            correction = _HEADING_PID.update(error, _DRIVE_LOOP.elapsed_ms / 1000)
+            velocity = profile_velocity(travelled, travelled_distance)
 
-            left_drive_smart.set_velocity(CONFIG_ROBOT_DRIVE_VEL_PCT + correction, PERCENT)
-            right_drive_smart.set_velocity(CONFIG_ROBOT_DRIVE_VEL_PCT - correction, PERCENT)
-            left_drive_smart.spin(FORWARD)
-            right_drive_smart.spin(FORWARD)
-            spin_wait()
+            _LEFT_COMMAND.spin(velocity + correction)
+            _RIGHT_COMMAND.spin(velocity - correction)
+            _DRIVE_LOOP.wait()
+            span_end(Span.SPAN_MOVE_ITER, start)
 
         left_drive_smart.stop()
         right_drive_smart.stop()
+        _TELEMETRY.record_run(tiles, get_time_ms() - began)
+        if log_enabled(LogType.LOG_DEBUG):
+            log_event(LogType.LOG_DEBUG, "drive loop: %s, %d commands sent, %d skipped", _DRIVE_LOOP.summary(),
+                      _LEFT_COMMAND.sent + _RIGHT_COMMAND.sent, _LEFT_COMMAND.skipped + _RIGHT_COMMAND.skipped)
         
         # done.
         
         
 
-    def _follow_path_batched(self, path):
-        # In here, we'll want to follow a path until we are "on final approach".
-        # However, rather than scooting one by one, we'll first identify our
-        # starting orientation, and then traverse a whole line until we need 
-        # to turn, and continue to do the same until we reach our destination
-
-        def get_num_traversals_until_turn(coord_list, start_orient):
-            # In here, we find how long it takes until two elements' orientation
-            # in `path` doesn't match `orient`
-            index = 0
-            for coordinate in coord_list[:-1]:
-                cur = coordinate
-                next_pos = coord_list[index + 1]
-                next_orient = find_orient(cur, next_pos)
-                if next_orient != start_orient:
-                    return index, next_orient, False
-                
-                index += 1
-
-            return len(coord_list), start_orient, True
-        
-        log_event(LogType.LOG_DEBUG, "First point is %s, second is %s" % (path.points[0], path.points[1]))
-        initial_orient = find_orient(path.points[0], path.points[1]) # what is our initial orientation?
-        self.turn(initial_orient)
+    # Follows a path until we are "on final approach". The segments are already the
+    # straight runs between turns, so each one is a turn and then one drive forward.
+    #
+    # The last run of a path has always been driven one tile further than the path
+    # goes (onto the house tile), which is what the final approach is tuned for.
+    def _follow_path_batched(self, path, last):
+        log_event(LogType.LOG_TRACE, "Path: %s", path)
 
-        traversed_steps = 0
-        log_event(LogType.LOG_TRACE, "Path: %s" % (path.points))
-        next_orient = initial_orient
-        while True:
-            old_orient = next_orient
-            steps, next_orient, done = get_num_traversals_until_turn(path.points[traversed_steps:], 
-                                                          next_orient)
-
-            log_event(LogType.LOG_TRACE, "Moving %d tiles forward" % steps)
-            self.move_by_tiles(steps, old_orient)
-            if not done:
-                self.turn(next_orient)
-            log_event(LogType.LOG_TRACE, "Traversed %d steps in %f" % (steps, next_orient))
-            traversed_steps += steps
-            if done:
-                break
-        
-        self.position = path.points[-1]
+        if CONFIG_ANY_ANGLE:
+            self._follow_path_any_angle(path, last)
+            return
+
+        for i in range(len(path.segments)):
+            heading, tiles = path.segments[i]
+            if last and i == len(path.segments) - 1:
+                tiles += 1
+
+            orient = _HEADING_DEGREES[heading]
+            self.turn(orient)
+            log_event(LogType.LOG_TRACE, "Moving %d tiles forward", tiles)
+            self.move_by_tiles(tiles, orient)
+
+        self.position = path.end
+
+    # Same as `_follow_path_batched`, only with the corners cut (see any_angle_waypoints), so
+    # straight runs can go at any angle, for any (not necessarily whole) number of tiles
+    def _follow_path_any_angle(self, path, last):
+        waypoints = any_angle_waypoints(MAP, path, last)
+
+        for i in range(1, len(waypoints)):
+            x0, y0 = waypoints[i - 1]
+            x1, y1 = waypoints[i]
+            dx = x1 - x0
+            dy = y1 - y0
+            tiles = math.sqrt(dx * dx + dy * dy)
+            if last and i == len(waypoints) - 1:
+                tiles += 1
+
+            orient = math.degrees(math.atan2(dx, dy)) % 360 # 0 is north (+y), 90 is east (+x)
+            self.turn(orient)
+            log_event(LogType.LOG_TRACE, "Moving %f tiles forward at %f", tiles, orient)
+            self.move_by_tiles(tiles, orient)
+
+        self.position = path.end
 
 
     def follow_path(self, path):
+        start = span_begin()
         log_event(LogType.LOG_TRACE, "starting path traversal")
-        self._follow_path_batched(path)
+
+        # a piece is only known to be the last one once the next one doesn't come
+        previous = None
+        for piece in path.pieces():
+            if previous is not None:
+                self._follow_path_batched(previous, False)
+            previous = piece
+        if previous is not None:
+            self._follow_path_batched(previous, True)
 
         # Go "on final"
         log_event(LogType.LOG_TRACE, "completed path traversal")
         self.turn(path.final_orient)
+        self.final_approach(path.final_len)
+        span_end(Span.SPAN_FOLLOW_PATH, start)
 
-        if not CONFIG_NOP_MOVES:
-            drivetrain.set_drive_velocity(CONFIG_ROBOT_FINAL_VEL_PCT, PERCENT)
+        # OK
 
-            while distance_sensor.object_distance(INCHES) > CONFIG_DIST_SENSOR_AT_HOUSE:
-                drivetrain.drive_for(FORWARD, 1) # scoot an inch
-                
-            drivetrain.set_drive_velocity(CONFIG_ROBOT_DRIVE_VEL_PCT, PERCENT)
+    # Drive up to the house we're facing until the distance sensor says we're there, in one
+    # go on the drive loop, slowing down as the distance left shrinks. Readings go through a
+    # median of the last three, which throws out single bad ones for one tick of lag.
+    #
+    # If the sensor keeps reading out of range, we drive whatever is left of `fallback_inches`
+    # blind instead (the location's final_len, which is how far it is meant to be).
+    def final_approach(self, fallback_inches = 0):
+        if CONFIG_NOP_MOVES:
+            return
 
-        # OK
+        degrees_per_inch = 360 / (CONFIG_WHEEL_DIAMETER_IN * math.pi)
+        give_up = get_time_ms() + CONFIG_APPROACH_TIMEOUT_MS
+        readings = [CONFIG_DIST_SENSOR_MAX_IN] * 3
+        count = 0
+        bad = 0
+
+        left_drive_smart.set_position(0, DEGREES)
+        right_drive_smart.set_position(0, DEGREES)
+        _LEFT_COMMAND.reset()
+        _RIGHT_COMMAND.reset()
+        _DRIVE_LOOP.start()
+
+        while True:
+            reading = distance_sensor.object_distance(INCHES)
+            if reading > CONFIG_DIST_SENSOR_MAX_IN:
+                bad += 1
+                if bad >= CONFIG_APPROACH_BAD_READINGS:
+                    break
+            else:
+                bad = 0
+                readings[count % 3] = reading
+                count += 1
+
+            a, b, c = readings
+            remaining = max(min(a, b), min(max(a, b), c)) - CONFIG_DIST_SENSOR_AT_HOUSE
+            if count and remaining <= 0:
+                break
+            if get_time_ms() > give_up:
+                log_event(LogType.LOG_WARN, "Final approach timed out %f inches short", remaining)
+                break
+
+            velocity = max(CONFIG_APPROACH_MIN_VEL_PCT, min(CONFIG_ROBOT_FINAL_VEL_PCT, CONFIG_APPROACH_KP * remaining))
+            _LEFT_COMMAND.spin(velocity)
+            _RIGHT_COMMAND.spin(velocity)
+            _DRIVE_LOOP.wait()
+
+        left_drive_smart.stop()
+        right_drive_smart.stop()
+
+        if bad >= CONFIG_APPROACH_BAD_READINGS:
+            travelled = (abs(left_drive_smart.position(DEGREES)) + abs(right_drive_smart.position(DEGREES))) / 2 / degrees_per_inch
+            log_event(LogType.LOG_WARN, "Distance sensor out of range, driving the last %f inches blind",
+                      fallback_inches - travelled)
+            if fallback_inches > travelled:
+                drivetrain.drive_for(FORWARD, fallback_inches - travelled, INCHES, CONFIG_ROBOT_FINAL_VEL_PCT, PERCENT)
 
     # "overloaded" internal function to make an adjustment
     def _adjust_internal(self, turn = None):
@@ -987,15 +2203,18 @@ class Robot:
                        self._adjust_forward, self._adjust_backward]
         adjustments[adjustment - 1]()
 
+    def drop_package(self):
+        belt_motor.spin_for(FORWARD, CONFIG_DELIVER_MOTOR_SPIN_DEG)
+
     def deliver_package(self, path):
         self.change_state(RobotState.ROBOT_DELIVERING)
 
-        belt_motor.spin_for(FORWARD, CONFIG_DELIVER_MOTOR_SPIN_DEG)
+        self.drop_package()
 
         log_event(LogType.LOG_TRACE, "spinning back around")
         if not CONFIG_NOP_MOVES:
             drivetrain.drive_for(REVERSE, path.final_len)
-            self.turn(0)
+            self.turn(_DELIVERED_ORIENT)
     
     def shutdown(self):
         # We used to have an arm lower here, but not anymore
@@ -1015,12 +2234,13 @@ def build_map_from_config():
             "obstacle out of bounds: %d, %d" % (coord[0], coord[1]),
         )
 
-        grid.tile(coord).weight = weight
+        grid.set_weight(coord, weight)
 
     return grid
 
 # We're using an A* algorithm here to pathfind, however we implemented very strong bias
-# towards avoiding turning and preferring direct straight lines for error minimization
+# towards avoiding turning and preferring direct straight lines for error minimization.
+# With CONFIG_TIME_COSTS that bias is simply what turns really cost us, in time (see PlanCosts)
 
 # As an effect of this, this algorithm often behaves identically to a much simpler, more
 # naive "drive forward to the right row, turn right, drive to right column", especially
@@ -1029,16 +2249,137 @@ def build_map_from_config():
 # However, we will preserve the use of A* in case we want to experiment with treating
 # smaller units as "tiles" (e.g. one virtual tile is not a physical tile on the ground)
 
+# The search runs over (tile, heading) states rather than plain tiles, where the heading is the
+# direction the robot faces after arriving at the tile. A state id is `index * 4 + heading`.
+# Since the turn penalty is part of the state transition, a tile reached "the wrong way first"
+# can't hide a cheaper straight path through it, and one search is always enough.
+#
+# The robot's starting heading is taken into account (if known), and so is the turn onto
+# `final_orient` once at the goal.
+
+# What a search charges for each move. With CONFIG_TIME_COSTS these are whole milliseconds of
+# expected driving, so the cheapest path is the fastest one, otherwise they're the old unitless
+# tile weights and CONFIG_TURN_COST.
+#   tile                      per unit of tile weight, so entering an ordinary tile costs this
+#   turn, turn_around         turning 90 or 180 degrees between two straight runs, including what
+#                             the extra run costs over just driving its tiles (speeding up and slowing down)
+#   turn_base, turn_per_deg   turning on the spot by any angle, i.e. onto a final_orient
+class PlanCosts:
+    def __init__(self, tile, turn, turn_around, turn_base, turn_per_deg):
+        self.tile = tile
+        self.turn = turn
+        self.turn_around = turn_around
+        self.turn_base = turn_base
+        self.turn_per_deg = turn_per_deg
+
+    def __repr__(self):
+        return "PlanCosts(tile=%d, turn=%d, turn_around=%d, final=%d+%.2f/deg)" % (
+            self.tile, self.turn, self.turn_around, self.turn_base, self.turn_per_deg)
+
+    # Cost of going on in `new_heading` after arriving facing `heading`
+    def turn_between(self, heading, new_heading):
+        if heading == new_heading:
+            return 0
+        if heading ^ new_heading == 2:
+            return self.turn_around
+        return self.turn
+
+    # Lower bound on the turning it takes to reach (dx, dy) away while facing `heading`, if
+    # nothing was in the way. Going back the way we came is one turn around or two turns, and
+    # going back and to the side is a turn and then whichever of those two is cheaper.
+    def min_turns_to(self, heading, dx, dy):
+        step_x, step_y = _HEADING_STEPS[heading]
+        if step_x != 0:
+            forward = dx * step_x
+            lateral = dy
+        else:
+            forward = dy * step_y
+            lateral = dx
+
+        if lateral == 0:
+            return 0 if forward >= 0 else min(self.turn_around, 2 * self.turn)
+        if forward >= 0:
+            return self.turn
+        return self.turn + min(self.turn, self.turn_around)
+
+    # Cost of turning from `heading` onto `final_orient` once at the goal (if there is one)
+    def final_turn(self, heading, final_orient):
+        if final_orient is None:
+            return 0
+        degrees = abs(angle_delta(final_orient, _HEADING_DEGREES[heading]))
+        if degrees < CONFIG_TURN_ERROR_MARGIN:
+            return 0
+        return self.turn_base + int(degrees * self.turn_per_deg)
+
+_PLAN_COSTS = None # What this mission plans with, fixed at init (see `plan_costs`)
+
+# The costs to plan with. The time based ones are only worked out once, at init, so that all the
+# plans in a mission (and the ones kept around by the incremental and hierarchical planners)
+# agree with each other. Whatever gets timed during the mission goes into the next one's.
+def plan_costs(ignore_turn_cost = False):
+    if CONFIG_TIME_COSTS:
+        costs = _PLAN_COSTS or _TELEMETRY.costs()
+    else:
+        costs = PlanCosts(1, CONFIG_TURN_COST, CONFIG_TURN_COST, CONFIG_TURN_COST, 0)
+    if ignore_turn_cost:
+        return PlanCosts(costs.tile, 0, 0, 0, 0)
+    return costs
+
+# What the last `astar_internal` call did, for benchmarking (see bench/). Keeping these is
+# a single int bump per expanded state, so they're always kept.
+class SearchStats:
+    def __init__(self):
+        self.expanded = 0 # states popped off the open set
+        self.pushes = 0 # states pushed onto it, including decrease-keys
+        self.peak = 0 # most states it held at once
+
+    def record(self, expanded, open_heap):
+        self.expanded = expanded
+        self.pushes = open_heap.pushes
+        self.peak = open_heap.peak
+
+_ASTAR_STATS = SearchStats()
+
+_ASTAR_FLAT_HEAP = None
+
+# The open set for one A* search on `grid`. Small maps reuse the one FlatIndexedHeap, unless another
+# thread's search has it right now, so searching doesn't allocate its bookkeeping every time.
+def astar_open_heap(grid):
+    global _ASTAR_FLAT_HEAP
+    if not CONFIG_ASTAR_INDEXED_HEAP:
+        return TupleHeap()
+
+    states = grid.size * 4
+    if states > CONFIG_ASTAR_FLAT_HEAP_MAX_STATES:
+        return IndexedHeap()
+
+    heap = _ASTAR_FLAT_HEAP
+    if heap is None or heap.capacity < states:
+        heap = FlatIndexedHeap(states)
+        _ASTAR_FLAT_HEAP = heap
+    elif heap.busy:
+        return FlatIndexedHeap(states)
+    else:
+        heap.reset()
+    heap.busy = True
+    return heap
+
+def release_open_heap(open_heap):
+    if open_heap is _ASTAR_FLAT_HEAP:
+        open_heap.busy = False
+
 # This algorithm can also be unbiased to test different degrees of turn costs to time efficiency
 def astar_internal(
     grid,
     start,
     goal,
-    start_dir = None,
+    start_heading = None,
     ignore_turn_cost = False,
+    final_orient = None,
 ):
-    log_event(LogType.LOG_DEBUG, "astar_with_directions called: start=%s, goal=%s, start_dir=%s, turn_cost=%s" %
-              (start, goal, start_dir, CONFIG_TURN_COST))
+    costs = plan_costs(ignore_turn_cost)
+    log_event(LogType.LOG_DEBUG, "astar_internal called: start=%s, goal=%s, start_heading=%s, final_orient=%s, costs=%s",
+              start, goal, start_heading, final_orient, costs)
 
     robo_assert(
         grid.in_bounds(start) and grid.in_bounds(goal),
@@ -1046,86 +2387,966 @@ def astar_internal(
         "start or goal out of bounds",
     )
 
+    # Everything below works on flat tile indices (see `GridMap`), and directions are headings
+    stride = grid.stride
+    weights = grid.weights
+    links = grid.links
+    offsets = grid.offsets
+    start_idx = grid.index(start)
+    goal_idx = grid.index(goal)
+    goal_x, goal_y = goal
+    tile_cost = costs.tile
+    turn_cost = costs.turn
+    turn_around_cost = costs.turn_around
+
+    goal_weight = weights[goal_idx]
     end_tile_changed = False
-    if not grid.tile(goal).traversable:
-        grid.tile(goal).weight = 0
+    if goal_weight < 0:
+        grid.set_weight_index(goal_idx, 0, transient = True)
         end_tile_changed = True
 
-    if not grid.tile(start).traversable:
+    if weights[start_idx] < 0:
+        if end_tile_changed:
+            grid.set_weight_index(goal_idx, goal_weight, transient = True)
+        _ASTAR_STATS.expanded = _ASTAR_STATS.pushes = _ASTAR_STATS.peak = 0
         return None
 
-    # (f_score, Coord)
-    open_heap = heapq()
-    heapq.heappush(open_heap, (0, start))
+    # Every other tile costs at least one tile to enter, but the goal might be cheaper (i.e. a
+    # house we've opened up above), so the last step is discounted to keep the heuristic admissible
+    goal_discount = tile_cost * (1 - min(weights[goal_idx], 1))
 
-    # path reconstruction
-    came_from = {}
-    came_from_dir = {}
+    def heuristic(state):
+        index = state >> 2
+        dx = goal_x - index % stride
+        dy = goal_y - index // stride
+        if dx == 0 and dy == 0:
+            return 0
+        return (abs(dx) + abs(dy)) * tile_cost - goal_discount + costs.min_turns_to(state & 3, dx, dy)
 
-    if start_dir is not None:
-        came_from_dir[start] = start_dir
+    # Cost of the final turn, paid once when arriving at the goal
+    def arrival_cost(heading):
+        return costs.final_turn(heading, final_orient)
 
-    g_score = {start: 0}
+    # state, by f_score
+    open_heap = astar_open_heap(grid)
 
-    def get_direction(a, b):
-        return (b[0] - a[0], b[1] - a[1])
+    # path reconstruction
+    came_from = {}
+    g_score = {}
 
-    # manhattan distance as we restrict ourselves to horizontal and vertical
-    def manhattan_heuristic(a, b):
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+    # With no known heading, the first move is free in any direction
+    if start_heading is None:
+        start_headings = _HEADINGS
+    else:
+        start_headings = (heading_of_degrees(start_heading),)
 
-    def reconstruct_path(came_from, current):
-        path = [current]
-        while current in came_from:
-            current = came_from[current]
-            path.append(current)
-        path.reverse()
-        return path
+    for heading in start_headings:
+        state = start_idx * 4 + heading
+        g_score[state] = arrival_cost(heading) if start_idx == goal_idx else 0
+        open_heap.push(state, g_score[state] + heuristic(state))
 
+    expanded = 0
     while open_heap:
-        _, current = heapq.heappop(open_heap)
+        current = open_heap.pop()
+        current_idx = current >> 2
+        expanded += 1
 
-        if current == goal:
-            path = Path(reconstruct_path(came_from, current))
+        if current_idx == goal_idx:
+            path = path_from_states(grid, came_from, current)
+            path.cost = g_score[current]
             log_event(LogType.LOG_TRACE, "found path")
             
             if end_tile_changed:
-                grid.tile(goal).weight = -1
+                grid.set_weight_index(goal_idx, goal_weight, transient = True)
             
+            _ASTAR_STATS.record(expanded, open_heap)
+            release_open_heap(open_heap)
             return path
 
-        for neighbor in grid.neighbors(current):
-            tentative_g = g_score[current] + grid.tile(neighbor).cost
-            move_dir = get_direction(current, neighbor)
-            prev_dir = came_from_dir.get(current)
+        # Walk the link mask rather than calling grid.neighbor_indices(),
+        # so that expanding a tile doesn't allocate anything
+        prev_dir = current & 3
+        current_g = g_score[current]
+        current_links = links[current_idx]
+        for move_dir in _EXPAND_ORDER:
+            if not current_links & _HEADING_BITS[move_dir]:
+                continue
+
+            neighbor_idx = current_idx + offsets[move_dir]
+            neighbor = neighbor_idx * 4 + move_dir
+            tentative_g = current_g + weights[neighbor_idx] * tile_cost
 
-            if prev_dir is not None and move_dir != prev_dir and not ignore_turn_cost:
-                tentative_g += CONFIG_TURN_COST
+            if move_dir != prev_dir:
+                tentative_g += turn_around_cost if move_dir ^ prev_dir == 2 else turn_cost
+
+            if neighbor_idx == goal_idx:
+                tentative_g += arrival_cost(move_dir)
 
             if neighbor not in g_score or tentative_g < g_score[neighbor]:
                 came_from[neighbor] = current
-                came_from_dir[neighbor] = move_dir
                 g_score[neighbor] = tentative_g
-                f_score = tentative_g + manhattan_heuristic(neighbor, goal)
-                heapq.heappush(open_heap, (f_score, neighbor))
+                f_score = tentative_g + heuristic(neighbor)
+                open_heap.push(neighbor, f_score)
 
     if end_tile_changed:
-        grid.tile(goal).weight = -1
+        grid.set_weight_index(goal_idx, goal_weight, transient = True)
 
+    _ASTAR_STATS.record(expanded, open_heap)
+    release_open_heap(open_heap)
     return None
 
+# Whether the robot can drive in a straight line from `a` to `b` (any coordinates, not just
+# tiles), without coming closer than CONFIG_ANY_ANGLE_CLEARANCE to an untraversable tile or
+# crossing (within half a tile) one that costs more than an ordinary one. We look at the tiles
+# around points half a tile apart along the line, so this is O(length).
+def line_of_sight(grid, a, b):
+    ax, ay = a
+    dx = b[0] - ax
+    dy = b[1] - ay
+    length_sq = dx * dx + dy * dy
+    # a sample can be up to a quarter tile from the closest point on the line, and rounding
+    # moves it up to another half a tile, on top of the clearance itself
+    reach = int(math.ceil(CONFIG_ANY_ANGLE_CLEARANCE + 0.75))
+    samples = int(math.sqrt(length_sq) * 2) + 1
+
+    for i in range(samples + 1):
+        cx = int(round(ax + dx * i / samples))
+        cy = int(round(ay + dy * i / samples))
+        for y in range(cy - reach, cy + reach + 1):
+            for x in range(cx - reach, cx + reach + 1):
+                if not grid.in_bounds((x, y)):
+                    continue
+                weight = grid.weight_at(grid.index((x, y)))
+                if weight == 1:
+                    continue
+
+                # how far (x, y) is from the line, from its closest point on it
+                t = 0.0
+                if length_sq:
+                    t = max(0.0, min(1.0, ((x - ax) * dx + (y - ay) * dy) / length_sq))
+                ox = ax + dx * t - x
+                oy = ay + dy * t - y
+                distance_sq = ox * ox + oy * oy
+                if weight < 0 and distance_sq < CONFIG_ANY_ANGLE_CLEARANCE * CONFIG_ANY_ANGLE_CLEARANCE:
+                    return False
+                if weight > 1 and distance_sq < 0.25:
+                    return False
+    return True
+
+# Cuts a path's corners: the points to drive straight between, from its start to its end,
+# keeping only the corners that a straight line can't skip (`line_of_sight`). The shortcuts
+# are taken greedily, going as far ahead as possible from each kept corner.
+#
+# With `keep_last`, the last tile of the last straight run is kept as is, so the path still
+# finishes on the heading it would have (which is what the final approach expects).
+def any_angle_waypoints(grid, path, keep_last = False):
+    corners = [path.start]
+    x, y = path.start
+    for heading, tiles in path.segments:
+        step_x, step_y = _HEADING_STEPS[heading]
+        x += step_x * tiles
+        y += step_y * tiles
+        corners.append((x, y))
+
+    # split the last tile off the last run, so only it has to stay as it is
+    if keep_last and path.segments and path.segments[-1][1] > 1:
+        step_x, step_y = _HEADING_STEPS[path.segments[-1][0]]
+        corners.insert(len(corners) - 1, (x - step_x, y - step_y))
+
+    last = len(corners) - 1
+    if keep_last and last > 0:
+        last -= 1
+
+    waypoints = [corners[0]]
+    anchor = 0
+    i = 1
+    while i <= last:
+        # look for the furthest corner we can see from the anchor
+        furthest = i
+        for j in range(last, i, -1):
+            if line_of_sight(grid, corners[anchor], corners[j]):
+                furthest = j
+                break
+        waypoints.append(corners[furthest])
+        anchor = furthest
+        i = furthest + 1
+
+    if last < len(corners) - 1:
+        waypoints.append(corners[-1])
+        # nothing got cut up to the split, so don't stop at it for nothing
+        if len(waypoints) >= 3:
+            (x0, y0), (x1, y1), (x2, y2) = waypoints[-3:]
+            if (x1 - x0) * (y2 - y1) == (y1 - y0) * (x2 - x1) and (x1 - x0) * (x2 - x1) + (y1 - y0) * (y2 - y1) > 0:
+                waypoints.pop(-2)
+    return waypoints
+
 # This will return a path WITHOUT a final_orient/len, we must add it on on top
-def astar(grid, start, goal):
-    path = astar_internal(grid, start, goal)
-    
+#
+# There used to be a second search here with the turn cost ignored whenever the first one
+# failed, but both searches can reach exactly the same tiles, so it could never succeed.
+def astar(grid, start, goal, start_heading = None, final_orient = None):
+    began = span_begin()
+    path = astar_internal(grid, start, goal, start_heading, final_orient = final_orient)
+    span_end(Span.SPAN_ASTAR, began)
+
+    if path is None:
+        log_event(LogType.LOG_WARN, "No path found from %s to %s", start, goal)
+
+    return path
+
+_INF = float("inf")
+
+# An incremental planner (D* Lite) for getting to one goal, from wherever the robot is.
+#
+# `astar_internal` throws its whole search away once it's done, so any change to the map means
+# starting over. This keeps its search tree around instead, and on the next `plan` only repairs
+# the parts that were affected by tiles changing (it listens to the GridMap for those) or by the
+# robot having moved along since the last plan.
+#
+# It searches the same (tile, heading) states as `astar_internal` with the same costs, but
+# backwards from the goal: g is the cost from a state to the goal. On top of those there are two
+# virtual states. GOAL is reached from the goal tile by turning onto `final_orient`, and START
+# leads (for free) into the start tile in whichever headings the robot might be facing.
+# Unlike `astar_internal`, the goal tile is never modified, just treated as free to enter.
+class IncrementalPlanner:
+    GOAL = -1
+    START = -2
+
+    def __init__(self, grid, goal, final_orient = None, ignore_turn_cost = False):
+        self.grid = grid
+        self.goal = goal
+        self.goal_idx = grid.index(goal)
+        self.final_orient = final_orient
+        self.costs = plan_costs(ignore_turn_cost)
+
+        self.g = {}
+        self.rhs = {}
+        self.open = IndexedHeap()
+        self.km = 0
+        self.start_idx = -1
+        self.start_headings = ()
+        self.changed = []
+        self.expansions = 0
+
+        grid.listeners.append(self._on_tile_changed)
+
+    # Stops listening to the map, call this once the planner is no longer needed
+    def close(self):
+        self.grid.listeners.remove(self._on_tile_changed)
+
+    def _on_tile_changed(self, index):
+        self.changed.append(index)
+
+    def _g(self, state):
+        return self.g.get(state, _INF)
+
+    def _rhs(self, state):
+        return self.rhs.get(state, _INF)
+
+    # Manhattan distance from the start (in tile costs), minus one tile on the goal tile, as that
+    # might be free to enter. This keeps the heuristic consistent without having to look at weights.
+    def _heuristic(self, state):
+        if state == IncrementalPlanner.START:
+            return 0
+        index = self.goal_idx if state == IncrementalPlanner.GOAL else state >> 2
+        stride = self.grid.stride
+        h = abs(index % stride - self.start_idx % stride) + abs(index // stride - self.start_idx // stride)
+        if index == self.goal_idx and h > 0:
+            h -= 1
+        return h * self.costs.tile
+
+    def _key(self, state):
+        best = min(self._g(state), self._rhs(state))
+        return (best + self._heuristic(state) + self.km, best)
+
+    def _enter_cost(self, index):
+        weight = self.grid.weights[index]
+        if weight < 0:
+            return 0 if index == self.goal_idx else _INF
+        return weight * self.costs.tile
+
+    # One-step lookahead, the best cost to the goal through any successor of `state`
+    def _compute_rhs(self, state):
+        if state == IncrementalPlanner.GOAL:
+            return 0
+
+        if state == IncrementalPlanner.START:
+            best = _INF
+            for heading in self.start_headings:
+                best = min(best, self._g(self.start_idx * 4 + heading))
+            return best
+
+        index = state >> 2
+        heading = state & 3
+        if index == self.goal_idx:
+            return self.costs.final_turn(heading, self.final_orient)
+        if self.grid.weights[index] < 0:
+            return _INF # can't be standing here in the first place
+
+        grid = self.grid
+        best = _INF
+        for move_dir in _EXPAND_ORDER:
+            if not grid.step_in_bounds(index, move_dir):
+                continue
+            neighbor = index + grid.offsets[move_dir]
+            cost = self._enter_cost(neighbor) + self.costs.turn_between(heading, move_dir)
+            cost += self._g(neighbor * 4 + move_dir)
+            if cost < best:
+                best = cost
+        return best
+
+    # Every state that has `state` as a successor
+    def _predecessors(self, state):
+        if state == IncrementalPlanner.START:
+            return []
+        if state == IncrementalPlanner.GOAL:
+            return [self.goal_idx * 4 + heading for heading in _HEADINGS]
+
+        index = state >> 2
+        heading = state & 3
+        result = []
+        if index == self.start_idx and heading in self.start_headings:
+            result.append(IncrementalPlanner.START)
+
+        back = (heading + 2) & 3
+        if self.grid.step_in_bounds(index, back):
+            prev = index + self.grid.offsets[back]
+            if prev != self.goal_idx: # the goal tile only ever leads to GOAL
+                for prev_heading in _HEADINGS:
+                    result.append(prev * 4 + prev_heading)
+        return result
+
+    def _update_state(self, state):
+        if state != IncrementalPlanner.GOAL:
+            self.rhs[state] = self._compute_rhs(state)
+        if state in self.open:
+            self.open.remove(state)
+        if self._g(state) != self._rhs(state):
+            self.open.push(state, self._key(state))
+
+    def _compute_shortest_path(self):
+        start = IncrementalPlanner.START
+        while self.open:
+            top = self.open.peek()
+            old_key = self.open.top_priority()
+            # Ties have to be processed too, as the start tile's own states share START's key
+            if not (old_key <= self._key(start) or self._rhs(start) != self._g(start)):
+                break
+
+            self.expansions += 1
+            new_key = self._key(top)
+            if old_key < new_key:
+                self.open.update(top, new_key)
+            elif self._g(top) > self._rhs(top):
+                self.g[top] = self._rhs(top)
+                self.open.remove(top)
+                for pred in self._predecessors(top):
+                    self._update_state(pred)
+            else:
+                self.g[top] = _INF
+                self._update_state(top)
+                for pred in self._predecessors(top):
+                    self._update_state(pred)
+
+    # Plans (or repairs the last plan) from `start`, facing `start_heading` (None for any heading).
+    # Returns a Path WITHOUT a final_orient/len, or None if the goal can't be reached.
+    def plan(self, start, start_heading = None):
+        robo_assert(
+            self.grid.in_bounds(start),
+            PanicReason.PANIC_COORD_INVALID,
+            "start out of bounds",
+        )
+        start_idx = self.grid.index(start)
+        if start_heading is None:
+            start_headings = _HEADINGS
+        else:
+            start_headings = (heading_of_degrees(start_heading),)
+
+        if self.start_idx < 0:
+            self.start_idx = start_idx
+            self.start_headings = start_headings
+            self.rhs[IncrementalPlanner.GOAL] = 0
+            self.open.push(IncrementalPlanner.GOAL, self._key(IncrementalPlanner.GOAL))
+        elif start_idx != self.start_idx or start_headings != self.start_headings:
+            # keys already in the queue are relative to the old start, km makes up the difference
+            stride = self.grid.stride
+            self.km += (abs(start_idx % stride - self.start_idx % stride)
+                        + abs(start_idx // stride - self.start_idx // stride)) * self.costs.tile
+            self.start_idx = start_idx
+            self.start_headings = start_headings
+            self._update_state(IncrementalPlanner.START)
+
+        changed = self.changed
+        self.changed = []
+        for index in changed:
+            # States on the changed tile (whether we can stand there), and the ones stepping onto it
+            for heading in _HEADINGS:
+                for state in [index * 4 + heading] + self._predecessors(index * 4 + heading):
+                    if state != IncrementalPlanner.START:
+                        self._update_state(state)
+            self._update_state(IncrementalPlanner.START)
+
+        self._compute_shortest_path()
+        log_event(LogType.LOG_TRACE, "incremental plan, %d expansions so far", self.expansions)
+
+        cost = self._g(IncrementalPlanner.START)
+        if cost == _INF:
+            return None
+
+        return self._extract_path(cost)
+
+    # Follows the cheapest successor from START down to the goal
+    def _extract_path(self, cost):
+        grid = self.grid
+        state = -1
+        for heading in self.start_headings:
+            candidate = self.start_idx * 4 + heading
+            if state < 0 or self._g(candidate) < self._g(state):
+                state = candidate
+
+        path = Path(grid.coord_of(self.start_idx))
+        for _ in range(grid.size * 4): # a path can't be longer than this
+            index = state >> 2
+            if index == self.goal_idx:
+                break
+
+            best = None
+            best_cost = _INF
+            for move_dir in _EXPAND_ORDER:
+                if not grid.step_in_bounds(index, move_dir):
+                    continue
+                neighbor = index + grid.offsets[move_dir]
+                step_cost = self._enter_cost(neighbor) + self.costs.turn_between(state & 3, move_dir)
+                step_cost += self._g(neighbor * 4 + move_dir)
+                if step_cost < best_cost:
+                    best = neighbor * 4 + move_dir
+                    best_cost = step_cost
+
+            robo_assert(best is not None, PanicReason.PANIC_PATH_NO_NEIGHBOR, "incremental plan is broken")
+            state = best
+            path.extend(state & 3)
+
+        path.cost = cost
+        return path
+
+# ---------------------- HIERARCHICAL PLANNING ----------------------
+#
+# For big maps, one search over the whole grid gets slow, so we plan in two levels (HPA*).
+#
+# The grid is cut into square clusters. Wherever two neighboring clusters share a run of
+# traversable tiles along their border, that run is an "entrance", and we pick its middle
+# (and its ends, if it's wide) as the places to cross. The abstract graph's nodes are the
+# (tile, heading) states right after crossing into a cluster, and its edges are the
+# turn-aware cost of getting from one of those, through its cluster, and across into the
+# next one. Those are found with a search confined to the cluster, and precomputed for every
+# entrance. That takes a while on a big map, but it happens on the first plan, which is on
+# the mission planning thread.
+#
+# A query only searches the start and goal clusters in full (as well as any cluster the goal
+# borders), and then the (small) abstract graph in between. Since crossings are fixed, routes come out a little longer than what a
+# full search would find (10-15% on cluttered maps), in exchange for planning much faster.
+# The actual tile-by-tile path is only worked out for one hop at a time, right before
+# the robot is about to drive it (see HierarchicalRoute).
+#
+# When tiles change, only the clusters they are in (and their neighbors, whose entrances
+# might have moved) get rebuilt, the next time a plan is asked for.
+
+_HPA_WIDE_ENTRANCE = 6 # Entrances at least this wide get crossings at both ends as well as the middle
+
+class HierarchicalPlanner:
+    START = -2
+    GOAL = -1
+
+    def __init__(self, grid, cluster_size):
+        self.grid = grid
+        self.cluster_size = cluster_size
+        self.clusters_x = grid.width // cluster_size + 1
+        self.clusters_y = grid.height // cluster_size + 1
+        self.cluster_count = self.clusters_x * self.clusters_y
+        self.costs = plan_costs()
+
+        # Every border belongs to the cluster west/south of it, and is keyed by that cluster and
+        # the heading (east or north) that crosses it. Each crossing is (inside, outside) tiles.
+        self.crossings = {}
+        self.exits = [[] for _ in range(self.cluster_count)] # cluster -> [(inside tile, entry node)]
+        self.entries = [[] for _ in range(self.cluster_count)] # cluster -> [entry node]
+        self.edges = {} # entry node -> [(entry node, cost)]
+        self.dirty = set(range(self.cluster_count))
+
+        grid.listeners.append(self._on_tile_changed)
+
+    def close(self):
+        self.grid.listeners.remove(self._on_tile_changed)
+
+    def cluster_of(self, index):
+        stride = self.grid.stride
+        return (index // stride // self.cluster_size) * self.clusters_x + (index % stride) // self.cluster_size
+
+    # inclusive (x0, y0, x1, y1) of a cluster
+    def bounds(self, cluster):
+        cx = cluster % self.clusters_x
+        cy = cluster // self.clusters_x
+        size = self.cluster_size
+        return (
+            cx * size,
+            cy * size,
+            min(cx * size + size - 1, self.grid.width),
+            min(cy * size + size - 1, self.grid.height),
+        )
+
+    def _on_tile_changed(self, index):
+        self.dirty.add(self.cluster_of(index))
+
+    # Finds the crossings over the border going `heading` (east or north) out of `cluster`
+    def _find_crossings(self, cluster, heading):
+        grid = self.grid
+        x0, y0, x1, y1 = self.bounds(cluster)
+        if heading == HEADING_EAST:
+            if x1 == grid.width:
+                return []
+            border = [grid.index((x1, y)) for y in range(y0, y1 + 1)]
+        else:
+            if y1 == grid.height:
+                return []
+            border = [grid.index((x, y1)) for x in range(x0, x1 + 1)]
+
+        offset = grid.offsets[heading]
+        result = []
+        run = []
+        for tile in border + [-1]:
+            if tile >= 0 and grid.weights[tile] >= 0 and grid.weights[tile + offset] >= 0:
+                run.append(tile)
+            elif run:
+                for inside in self._crossing_tiles(run):
+                    result.append((inside, inside + offset))
+                run = []
+        return result
+
+    # Which tiles of an entrance to cross at
+    def _crossing_tiles(self, run):
+        if len(run) < _HPA_WIDE_ENTRANCE:
+            return [run[len(run) // 2]]
+        return [run[0], run[len(run) // 2], run[-1]]
+
+    # The borders of a cluster, as (owning cluster, heading) keys, along with whether this
+    # cluster is the one owning it (i.e. is on the inside of its crossings)
+    def _borders(self, cluster):
+        result = [((cluster, HEADING_EAST), True), ((cluster, HEADING_NORTH), True)]
+        if cluster % self.clusters_x > 0:
+            result.append(((cluster - 1, HEADING_EAST), False))
+        if cluster >= self.clusters_x:
+            result.append(((cluster - self.clusters_x, HEADING_NORTH), False))
+        return result
+
+    def _rebuild(self):
+        if not self.dirty:
+            return
+
+        # A dirty cluster has all of its borders looked at again, which in turn changes
+        # the exits (and so the edges) of whoever is on the other side of them
+        affected = set()
+        for cluster in self.dirty:
+            for key, _ in self._borders(cluster):
+                self.crossings[key] = self._find_crossings(key[0], key[1])
+                owner, heading = key
+                affected.add(owner)
+                if heading == HEADING_EAST and owner % self.clusters_x < self.clusters_x - 1:
+                    affected.add(owner + 1)
+                elif heading == HEADING_NORTH and owner + self.clusters_x < self.cluster_count:
+                    affected.add(owner + self.clusters_x)
+
+        for cluster in affected:
+            exits = []
+            entries = []
+            for key, owned in self._borders(cluster):
+                heading = key[1]
+                for inside, outside in self.crossings.get(key, []):
+                    if owned:
+                        exits.append((inside, outside * 4 + heading))
+                        entries.append(inside * 4 + ((heading + 2) & 3))
+                    else:
+                        exits.append((outside, inside * 4 + ((heading + 2) & 3)))
+                        entries.append(outside * 4 + heading)
+
+            for node in self.entries[cluster]:
+                self.edges.pop(node, None)
+            self.exits[cluster] = exits
+            self.entries[cluster] = entries
+
+        for cluster in affected:
+            for node in self.entries[cluster]:
+                self._edges_of(node)
+
+        self.dirty = set()
+        log_event(LogType.LOG_TRACE, "hpa: rebuilt %d clusters", len(affected))
+
+    def _enter_cost(self, index, goal_idx):
+        weight = self.grid.weights[index]
+        if weight < 0:
+            return 0 if index == goal_idx else _INF
+        return weight * self.costs.tile
+
+    # Edges out of an entry node. These only depend on the node's own cluster, so they're kept
+    # until the cluster changes.
+    def _edges_of(self, node):
+        edges = self.edges.get(node)
+        if edges is None:
+            cluster = self.cluster_of(node >> 2)
+            g_score, _ = self._cluster_search(cluster, [(node, 0)])
+            edges = self._exit_costs(cluster, g_score)
+            self.edges[node] = edges
+        return edges
+
+    # Turn-aware Dijkstra over the states of one cluster, from `sources` [(state, g)].
+    # The goal tile (if any) is open, even when it's just over the cluster's border, but is only
+    # ever somewhere to stop.
+    def _cluster_search(self, cluster, sources, goal_idx = -1):
+        grid = self.grid
+        stride = grid.stride
+        weights = grid.weights
+        links = grid.links
+        offsets = grid.offsets
+        costs = self.costs
+        tile_cost = costs.tile
+        x0, y0, x1, y1 = self.bounds(cluster)
+
+        # a blocked goal has no links leading into it, so steps onto it are checked for separately
+        goal_blocked = goal_idx >= 0 and weights[goal_idx] < 0
+
+        g_score = {}
+        came_from = {}
+        open_set = IndexedHeap()
+        for state, g in sources:
+            g_score[state] = g
+            open_set.push(state, g)
+
+        while open_set:
+            current = open_set.pop()
+            index = current >> 2
+            if index == goal_idx:
+                continue
+
+            current_g = g_score[current]
+            current_links = links[index]
+            for move_dir in _EXPAND_ORDER:
+                neighbor_idx = index + offsets[move_dir]
+                if current_links & _HEADING_BITS[move_dir]:
+                    cost = weights[neighbor_idx] * tile_cost
+                elif goal_blocked and neighbor_idx == goal_idx and grid.step_in_bounds(index, move_dir):
+                    cost = 0
+                else:
+                    continue
+                x = neighbor_idx % stride
+                y = neighbor_idx // stride
+                if (x < x0 or x > x1 or y < y0 or y > y1) and neighbor_idx != goal_idx:
+                    continue
+                cost += costs.turn_between(current & 3, move_dir)
+                neighbor = neighbor_idx * 4 + move_dir
+                tentative_g = current_g + cost
+                if tentative_g < g_score.get(neighbor, _INF):
+                    g_score[neighbor] = tentative_g
+                    came_from[neighbor] = current
+                    open_set.push(neighbor, tentative_g)
+
+        return g_score, came_from
+
+    # Cheapest (cost, state), out of a cluster search, to stand on `inside` and then step across into `node`
+    def _best_exit(self, g_score, inside, node, goal_idx = -1):
+        step = self._enter_cost(node >> 2, goal_idx)
+        best = (_INF, -1)
+        for heading in _HEADINGS:
+            g = g_score.get(inside * 4 + heading)
+            if g is None:
+                continue
+            cost = g + step + self.costs.turn_between(heading, node & 3)
+            if cost < best[0]:
+                best = (cost, inside * 4 + heading)
+        return best
+
+    # Cheapest (cost, state), out of a cluster search, to stop on the goal and turn to `final_orient`
+    def _best_goal(self, g_score, goal_idx, final_orient):
+        best = (_INF, -1)
+        for heading in _HEADINGS:
+            g = g_score.get(goal_idx * 4 + heading)
+            if g is None:
+                continue
+            cost = g + self.costs.final_turn(heading, final_orient)
+            if cost < best[0]:
+                best = (cost, goal_idx * 4 + heading)
+        return best
+
+    # [(entry node, cost)] for every exit of `cluster` reachable in a search of it
+    def _exit_costs(self, cluster, g_score, goal_idx = -1):
+        result = []
+        for inside, node in self.exits[cluster]:
+            cost, _ = self._best_exit(g_score, inside, node, goal_idx)
+            if cost != _INF:
+                result.append((node, cost))
+        return result
+
+    # Plans from `start` to `goal`, returning a HierarchicalRoute (or None if there's no way there)
+    def plan(self, start, start_heading, goal, final_orient = None):
+        grid = self.grid
+        robo_assert(
+            grid.in_bounds(start) and grid.in_bounds(goal),
+            PanicReason.PANIC_COORD_INVALID,
+            "start or goal out of bounds",
+        )
+        self._rebuild()
+
+        start_idx = grid.index(start)
+        goal_idx = grid.index(goal)
+        if grid.weights[start_idx] < 0 and start_idx != goal_idx:
+            return None
+
+        if start_heading is None:
+            start_states = [(start_idx * 4 + heading, 0) for heading in _HEADINGS]
+        else:
+            start_states = [(start_idx * 4 + heading_of_degrees(start_heading), 0)]
+
+        start_cluster = self.cluster_of(start_idx)
+        # A goal on a cluster's border can be stepped onto from the cluster on the other side
+        # too, which matters when the goal is blocked (a house), as no crossing leads onto it
+        goal_clusters = set([self.cluster_of(goal_idx)])
+        for heading in _HEADINGS:
+            if grid.step_in_bounds(goal_idx, heading):
+                goal_clusters.add(self.cluster_of(goal_idx + grid.offsets[heading]))
+        stride = grid.stride
+        goal_x, goal_y = goal
+
+        # Same bound as astar_internal's, as the abstract edges are made of the same moves
+        def heuristic(node):
+            if node == HierarchicalPlanner.GOAL:
+                return 0
+            if node == HierarchicalPlanner.START:
+                return min([heuristic(state) for state, _ in start_states])
+            index = node >> 2
+            dx = goal_x - index % stride
+            dy = goal_y - index // stride
+            if dx == 0 and dy == 0:
+                return 0
+            # minus one tile as the goal tile itself might be free to enter
+            return (abs(dx) + abs(dy) - 1) * self.costs.tile + self.costs.min_turns_to(node & 3, dx, dy)
+
+        # Edges out of an abstract node, for this query. The precomputed ones do for everything
+        # but the start cluster and the ones next to the goal, which need searching with the goal
+        # tile open.
+        def successors(node):
+            if node == HierarchicalPlanner.START:
+                cluster = start_cluster
+                sources = start_states
+            else:
+                cluster = self.cluster_of(node >> 2)
+                if cluster not in goal_clusters:
+                    return self._edges_of(node)
+                sources = [(node, 0)]
+
+            g_score, _ = self._cluster_search(cluster, sources, goal_idx)
+            result = self._exit_costs(cluster, g_score, goal_idx)
+            if cluster in goal_clusters:
+                cost, _ = self._best_goal(g_score, goal_idx, final_orient)
+                if cost != _INF:
+                    result.append((HierarchicalPlanner.GOAL, cost))
+            return result
+
+        g_score = {HierarchicalPlanner.START: 0}
+        came_from = {}
+        open_set = IndexedHeap()
+        open_set.push(HierarchicalPlanner.START, heuristic(HierarchicalPlanner.START))
+
+        while open_set:
+            current = open_set.pop()
+            if current == HierarchicalPlanner.GOAL:
+                nodes = [current]
+                while current in came_from:
+                    current = came_from[current]
+                    nodes.append(current)
+                nodes.reverse()
+                return HierarchicalRoute(self, start_states, nodes, goal_idx, final_orient,
+                                         g_score[HierarchicalPlanner.GOAL])
+
+            for node, cost in successors(current):
+                tentative_g = g_score[current] + cost
+                if tentative_g < g_score.get(node, _INF):
+                    g_score[node] = tentative_g
+                    came_from[node] = current
+                    open_set.push(node, tentative_g + heuristic(node))
+
+        log_event(LogType.LOG_WARN, "hpa: no path found from %s to %s", start, goal)
+        return None
+
+    # Works out the tiles of one abstract hop, from `sources` to `target` (an entry node or GOAL)
+    def refine(self, sources, target, goal_idx, final_orient):
+        grid = self.grid
+        cluster = self.cluster_of(sources[0][0] >> 2)
+        g_score, came_from = self._cluster_search(cluster, sources, goal_idx)
+
+        if target == HierarchicalPlanner.GOAL:
+            _, state = self._best_goal(g_score, goal_idx, final_orient)
+        else:
+            inside = (target >> 2) + grid.offsets[((target & 3) + 2) & 3]
+            _, state = self._best_exit(g_score, inside, target, goal_idx)
+
+        robo_assert(state >= 0, PanicReason.PANIC_PATH_INVALID, "hpa: abstract hop can't be refined")
+        path = path_from_states(grid, came_from, state)
+        if target != HierarchicalPlanner.GOAL:
+            path.extend(target & 3) # and across into the next cluster
+        return path
+
+# The result of a HierarchicalPlanner query: the abstract hops to take, refined into
+# actual Paths only as they are asked for. Quacks like a Path as far as driving goes.
+class HierarchicalRoute:
+    def __init__(self, planner, start_states, nodes, goal_idx, final_orient, cost):
+        self.planner = planner
+        self.start_states = start_states
+        self.nodes = nodes # [START, entry nodes..., GOAL]
+        self.goal_idx = goal_idx
+        self.final_orient = final_orient
+        self.final_len = 0
+        self.cost = cost
+        self.map_version = planner.grid.version
+
+    def __bool__(self):
+        return True
+
+    # One Path per hop, each worked out right before it's needed
+    def pieces(self):
+        robo_assert(
+            self.map_version == self.planner.grid.version,
+            PanicReason.PANIC_PATH_INVALID,
+            "hpa: map changed under a route",
+        )
+        for i in range(1, len(self.nodes)):
+            if i == 1:
+                sources = self.start_states
+            else:
+                sources = [(self.nodes[i - 1], 0)]
+
+            piece = self.planner.refine(sources, self.nodes[i], self.goal_idx, self.final_orient)
+            if piece.segments:
+                yield piece
+
+    # Refines every hop up front, into one Path
+    def to_path(self):
+        start = self.planner.grid.coord_of(self.start_states[0][0] >> 2)
+        path = Path(start, None, self.final_orient, self.final_len)
+        for piece in self.pieces():
+            path.join(piece)
+        path.cost = self.cost
+        return path
+
+_HPA = None # HierarchicalPlanner for MAP, if it's big enough to need one
+
+# A bounded cache of planned paths, so a leg we've already planned (i.e. yet another trip
+# back to the warehouse) starts moving without waiting on the planner.
+#
+# Entries are keyed by everything that goes into a search, including the map version.
+# When the map changes, every entry is stale, so the cache is simply emptied.
+class PathCache:
+    def __init__(self, max_segments):
+        self.max_segments = max_segments
+        self.entries = {} # key -> [path, last_used]
+        self.segments = 0
+        self.version = 0
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries = {}
+        self.segments = 0
+
+    def _check_version(self, version):
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def get(self, key, version):
+        self._check_version(version)
+        self.clock += 1
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry[1] = self.clock
+        return entry[0].copy()
+
+    def put(self, key, version, path):
+        self._check_version(version)
+        size = len(path.segments)
+        if size > self.max_segments:
+            return
+
+        # evict least recently used until it fits
+        while self.segments + size > self.max_segments:
+            oldest = None
+            for other_key in self.entries:
+                if oldest is None or self.entries[other_key][1] < self.entries[oldest][1]:
+                    oldest = other_key
+            self.segments -= len(self.entries.pop(oldest)[0].segments)
+
+        self.clock += 1
+        self.entries[key] = [path.copy(), self.clock]
+        self.segments += size
+
+    def summary(self):
+        return "%d hits, %d misses, %d paths cached" % (self.hits, self.misses, len(self.entries))
+
+_PATH_CACHE = PathCache(CONFIG_PATH_CACHE_MAX_SEGMENTS)
+
+# `astar`, but going through `_PATH_CACHE` first
+def astar_cached(grid, start, goal, start_heading = None, final_orient = None):
+    # the planner only ever looks at the snapped heading, so that's all we key on
+    heading = None if start_heading is None else heading_of_degrees(start_heading)
+    key = (start, goal, heading, final_orient)
+
+    path = _PATH_CACHE.get(key, grid.version)
     if path is not None:
+        log_event(LogType.LOG_TRACE, "path cache hit")
         return path
 
-    log_event(LogType.LOG_WARN, "No path found with turn_cost=%d, retrying with turn_cost=0" % CONFIG_TURN_COST)
-    return astar_internal(grid, start, goal, start_dir = None, ignore_turn_cost = True)
+    path = astar(grid, start, goal, start_heading, final_orient)
+    if path is not None:
+        _PATH_CACHE.put(key, grid.version, path)
+    return path
 
-def generate_path_for_destination(target):
-    path = astar(MAP, ROBOT.position, target.coords)
+# Plans from where the robot is right now, unless told to plan from somewhere else
+def generate_path_for_destination(target, start = None, start_heading = None):
+    if start is None:
+        start = ROBOT.position
+        start_heading = brain_inertial.heading(DEGREES)
+
+    if _HPA is not None:
+        path = _HPA.plan(start, start_heading, target.coords, target.final_orient)
+    else:
+        path = astar_cached(MAP, start, target.coords, start_heading, target.final_orient)
+    if path is None:
+        return None
+
+    path.final_orient = target.final_orient
+    path.final_len = target.final_len
+    return path
+
+_REPLANNER = None # IncrementalPlanner for the leg we last had to replan
+
+# Replans the leg to `target` from where the robot is right now, for when the
+# planned leg no longer holds (we're somewhere else, or the map has changed)
+def replan_path_for_destination(target):
+    global _REPLANNER
+    if not CONFIG_INCREMENTAL_REPLAN:
+        return generate_path_for_destination(target)
+
+    if _REPLANNER is None or _REPLANNER.goal != target.coords or _REPLANNER.final_orient != target.final_orient:
+        if _REPLANNER is not None:
+            _REPLANNER.close()
+        _REPLANNER = IncrementalPlanner(MAP, target.coords, target.final_orient)
+
+    path = _REPLANNER.plan(ROBOT.position, brain_inertial.heading(DEGREES))
+    if path is None:
+        return None
 
     path.final_orient = target.final_orient
     path.final_len = target.final_len
@@ -1134,6 +3355,217 @@ def generate_path_for_destination(target):
 MAP = None
 ROBOT = None
 
+# A leg of the mission, planned ahead of time by `plan_mission`.
+# `path` is None if there was no way to get to `target` from `start`.
+class MissionLeg:
+    def __init__(self, target, start, start_heading, path, map_version):
+        self.target = target
+        self.start = start
+        self.start_heading = start_heading
+        self.path = path
+        self.map_version = map_version
+
+    # Whether this leg was planned for where the robot actually is, on the map as it is now
+    def valid_from(self, position, heading):
+        return (
+            self.start == position
+            and heading_of_degrees(self.start_heading) == heading_of_degrees(heading)
+            and self.map_version == MAP.version
+        )
+
+# ---------------------- ROUTE ORDERING ----------------------
+#
+# CONFIG_ROUTE is split into runs of houses between trips back to the warehouse. The order of
+# the houses within a run doesn't matter for the deliveries, so we pick the order that costs
+# the least to drive, as the planner sees it (so turns count too).
+#
+# After every delivery the robot faces `_DELIVERED_ORIENT`, which means the cost of driving
+# from one location to another doesn't depend on how we got to the first one. That makes this
+# the classic travelling salesman problem with a fixed start (and a fixed end when the run
+# finishes at the warehouse), which is small enough to solve outright for a handful of houses.
+
+_ROUTE_UNREACHABLE = 1e12 # Leg cost for a leg with no path, bigger than any real one (even in milliseconds)
+
+def leg_cost(start, start_heading, target):
+    path = generate_path_for_destination(target, start, start_heading)
+    if path is None:
+        return _ROUTE_UNREACHABLE
+    return path.cost
+
+# Total cost of visiting `order` (indices into the cost matrix's stops).
+# `costs[i][j]` is the cost from stop i to stop j, where index 0 is the start of the run.
+def _route_order_cost(order, costs, end_costs):
+    total = 0
+    prev = 0
+    for stop in order:
+        total += costs[prev][stop]
+        prev = stop
+    if end_costs is not None:
+        total += end_costs[prev]
+    return total
+
+# Held-Karp, dynamic programming over subsets of stops
+def _route_order_exact(count, costs, end_costs):
+    full = (1 << count) - 1
+    # best[mask][last] = cheapest cost of visiting `mask`, finishing at stop `last + 1`
+    best = [[_ROUTE_UNREACHABLE * (count + 2)] * count for _ in range(full + 1)]
+    parent = [[-1] * count for _ in range(full + 1)]
+
+    for last in range(count):
+        best[1 << last][last] = costs[0][last + 1]
+
+    for mask in range(1, full + 1):
+        for last in range(count):
+            if not mask & (1 << last):
+                continue
+            cost = best[mask][last]
+            for nxt in range(count):
+                if mask & (1 << nxt):
+                    continue
+                new_mask = mask | (1 << nxt)
+                new_cost = cost + costs[last + 1][nxt + 1]
+                if new_cost < best[new_mask][nxt]:
+                    best[new_mask][nxt] = new_cost
+                    parent[new_mask][nxt] = last
+
+    last = 0
+    for candidate in range(count):
+        end = 0 if end_costs is None else end_costs[candidate + 1]
+        chosen_end = 0 if end_costs is None else end_costs[last + 1]
+        if best[full][candidate] + end < best[full][last] + chosen_end:
+            last = candidate
+
+    order = []
+    mask = full
+    while last != -1:
+        order.append(last + 1)
+        prev = parent[mask][last]
+        mask &= ~(1 << last)
+        last = prev
+    order.reverse()
+    return order
+
+# Nearest neighbor to start off, then 2-opt and or-opt moves until nothing improves
+def _route_order_heuristic(count, costs, end_costs):
+    order = []
+    remaining = list(range(1, count + 1))
+    prev = 0
+    while remaining:
+        nxt = remaining[0]
+        for stop in remaining:
+            if costs[prev][stop] < costs[prev][nxt]:
+                nxt = stop
+        remaining.remove(nxt)
+        order.append(nxt)
+        prev = nxt
+
+    best_cost = _route_order_cost(order, costs, end_costs)
+    improved = True
+    while improved:
+        improved = False
+
+        # 2-opt, reverse order[i:j]
+        for i in range(count - 1):
+            for j in range(i + 2, count + 1):
+                candidate = order[:i] + order[i:j][::-1] + order[j:]
+                cost = _route_order_cost(candidate, costs, end_costs)
+                if cost < best_cost:
+                    order, best_cost, improved = candidate, cost, True
+
+        # or-opt, move a run of up to 3 stops somewhere else
+        for length in (1, 2, 3):
+            for i in range(count - length + 1):
+                moved = order[i:i + length]
+                rest = order[:i] + order[i + length:]
+                for j in range(len(rest) + 1):
+                    candidate = rest[:j] + moved + rest[j:]
+                    cost = _route_order_cost(candidate, costs, end_costs)
+                    if cost < best_cost:
+                        order, best_cost, improved = candidate, cost, True
+
+    return order
+
+# Reorders one run of houses in place, starting from `start` and ending at `end` (or anywhere)
+def _optimize_run(houses, start, start_heading, end):
+    count = len(houses)
+    if count < 2:
+        return
+
+    # stop 0 is where the run starts, stops 1..count are the houses
+    coords = [start] + [house.coords for house in houses]
+    headings = [start_heading] + [_DELIVERED_ORIENT] * count
+    costs = [
+        [0 if j == 0 or i == j else leg_cost(coords[i], headings[i], houses[j - 1])
+         for j in range(count + 1)]
+        for i in range(count + 1)
+    ]
+    end_costs = None
+    if end is not None:
+        # the run visits at least two houses, so it never goes straight from stop 0 to `end`
+        end_costs = [0] + [leg_cost(coords[i], headings[i], end) for i in range(1, count + 1)]
+
+    if count <= CONFIG_ROUTE_OPT_EXACT_MAX:
+        order = _route_order_exact(count, costs, end_costs)
+    else:
+        order = _route_order_heuristic(count, costs, end_costs)
+
+    if log_enabled(LogType.LOG_DEBUG):
+        log_event(LogType.LOG_DEBUG, "Route run cost %d -> %d",
+                  _route_order_cost(list(range(1, count + 1)), costs, end_costs),
+                  _route_order_cost(order, costs, end_costs))
+
+    houses[:] = [houses[stop - 1] for stop in order]
+
+def optimize_route():
+    start = CONFIG_ROBOT_START_POS
+    start_heading = CONFIG_ROBOT_START_ORIENTATION
+    run_start = 0
+
+    for i in range(len(ROUTE) + 1):
+        if i < len(ROUTE) and not ROUTE[i].is_warehouse:
+            continue
+
+        end = ROUTE[i] if i < len(ROUTE) else None
+        run = ROUTE[run_start:i]
+        _optimize_run(run, start, start_heading, end)
+        ROUTE[run_start:i] = run
+
+        if end is not None:
+            start = end.coords
+            start_heading = _DELIVERED_ORIENT
+        run_start = i + 1
+
+_MISSION_LEGS = [] # MissionLegs from `plan_mission`, consumed in order by `traverse_all`
+_MISSION_PLANNED = False
+
+# Plans every leg of ROUTE up front, each starting where the previous one leaves the robot.
+#
+# This runs on its own thread while the operator is still calibrating, so that none of the
+# planning lands between deliveries. Legs get replanned on the spot if the robot ends up
+# somewhere other than where we expected.
+def plan_mission():
+    global _MISSION_PLANNED
+    if CONFIG_ROUTE_OPTIMIZE:
+        optimize_route()
+
+    position = CONFIG_ROBOT_START_POS
+    heading = CONFIG_ROBOT_START_ORIENTATION
+
+    for target in ROUTE:
+        path = generate_path_for_destination(target, position, heading)
+        _MISSION_LEGS.append(MissionLeg(target, position, heading, path, MAP.version))
+
+        # `travel_to` doesn't move the robot at all when there is no path
+        if path is not None:
+            position = target.coords
+            heading = _DELIVERED_ORIENT
+
+        log_event(LogType.LOG_TRACE, "Planned leg to %s", target.name)
+        spin_wait() # let the calibration and UI threads have a turn
+
+    log_event(LogType.LOG_DEBUG, "Planned %d legs", len(_MISSION_LEGS))
+    _MISSION_PLANNED = True
+
 def deliver_complete():
     if ROBOT.state == RobotState.ROBOT_DELIVERING:
         ROBOT.change_state(RobotState.ROBOT_DELIVERED)    
@@ -1144,7 +3576,7 @@ def deliver_adj_complete():
 
 def deliver_a():
     if ROBOT.state == RobotState.ROBOT_DELIVERING:
-        play_audio("adjusting.wav", blocking=False)
+        play_audio("adjusting.wav", key="progress")
         ROBOT.change_state(RobotState.ROBOT_ADJUSTING)
 
 def calibrate_b():
@@ -1189,49 +3621,75 @@ def robot_render_pos():
         brain.screen.print("(" + str(x) + ", " + str(y) + ") " + dgstr + " " +  dstr)
         spin_wait()
 
-def travel_to(target):
-    global MAP
-    path = generate_path_for_destination(target)
+# Waits on the operator to move the robot along to `state` (i.e. by pressing B)
+def wait_for_operator(state):
+    while ROBOT.state != state:
+        spin_wait()
+
+def travel_to(leg):
+    target = leg.target
+    if leg.valid_from(ROBOT.position, brain_inertial.heading(DEGREES)):
+        path = leg.path
+    else:
+        log_event(LogType.LOG_WARN, "Replanning leg to %s", target.name)
+        path = replan_path_for_destination(target)
         
     if not path:
-        play_audio("alert_no_valid_path.wav")
+        play_audio("alert_no_valid_path.wav", priority=AudioPriority.AUDIO_ALERT)
         return
     
     log_event(LogType.LOG_TRACE, "Following path")
-    play_audio("travelling_to.wav")
-    play_audio(target.audio_file)
+    # said while we're already on the way
+    play_audio(("travelling_to.wav", target.audio_file), priority=AudioPriority.AUDIO_ANNOUNCE,
+               key="progress", max_age_ms=CONFIG_AUDIO_ANNOUNCE_STALE_MS)
     ROBOT.follow_path(path)
     ROBOT.deliver_package(path)
-    play_audio("complete.wav", blocking=False)
+    play_audio("complete.wav", key="progress")
+    wait_for_operator(RobotState.ROBOT_DELIVERED)
 
-    while ROBOT.state != RobotState.ROBOT_DELIVERED:
-        spin_wait()
-
-    play_audio("continuing.wav", blocking=False)
+    play_audio("continuing.wav", key="progress")
 
     
-def get_next_location():
+def get_next_leg():
     ROBOT.change_state(RobotState.ROBOT_SELECTING)
-    if len(ROUTE):
-        return ROUTE.pop(0)
+    if len(_MISSION_LEGS):
+        return _MISSION_LEGS.pop(0)
 
     return None
 
+# Planning normally finishes long before calibration does, but just in case
+def wait_for_mission_plan():
+    while not _MISSION_PLANNED:
+        spin_wait()
+
 def traverse_all():
-    next_place = get_next_location()
-    while next_place is not None:
-        travel_to(next_place)
-        next_place = get_next_location()
+    wait_for_mission_plan()
+
+    next_leg = get_next_leg()
+    while next_leg is not None:
+        start = span_begin()
+        travel_to(next_leg)
+        span_end(Span.SPAN_LEG, start)
+        next_leg = get_next_leg()
 
 # THE BIG INIT - initialize in-software things BEFORE calibration 
 # (i.e. initialize things that don't need user input)
 def init():
     parse_locations()
-    global MAP, ROBOT
+    check_audio()
+    global MAP, ROBOT, _HPA, _PLAN_COSTS
     MAP = build_map_from_config()
     if CONFIG_DEBUG:
         print_grid(MAP)
 
+    if CONFIG_TIME_COSTS:
+        _TELEMETRY.load()
+        _PLAN_COSTS = _TELEMETRY.costs()
+        log_event(LogType.LOG_DEBUG, "Planning with %s", _PLAN_COSTS)
+
+    if MAP.size >= CONFIG_HPA_MIN_TILES:
+        _HPA = HierarchicalPlanner(MAP, CONFIG_HPA_CLUSTER_SIZE)
+
     ROBOT = Robot(CONFIG_ROBOT_START_POS)
     # Code init finished
 
@@ -1250,24 +3708,40 @@ def init():
 
     brain.screen.set_font(CONFIG_FONT)
 
+    if CONFIG_DEBUG:
+        controller.buttonLeft.pressed(drain_logs_to_screen)
+        panic_callback_register(PanicCallback("drain_logs", PanicPhase.PANIC_SNAPSHOT_STATE, drain_logs_to_sd))
+    if CONFIG_PROFILE:
+        controller.buttonX.pressed(show_profile)
+        controller.buttonY.pressed(dump_profile)
+        panic_callback_register(PanicCallback("dump_profile", PanicPhase.PANIC_SNAPSHOT_STATE, dump_profile))
+
     init_advance(InitStage.INIT_ROBOT)
 
 def main():
     init()    
     controller.buttonB.pressed(calibrate_b)
+    _AUDIO.start()
 
-    play_audio("on.wav", blocking=False)
-
-    while ROBOT.state != RobotState.ROBOT_INITIALIZED:
-        spin_wait()
+    # Plan the whole route while we wait on the operator to calibrate
+    Thread(plan_mission)
+    play_audio("on.wav", key="progress")
+    wait_for_operator(RobotState.ROBOT_INITIALIZED)
 
     drivetrain.set_turn_velocity(CONFIG_ROBOT_TURN_VEL_PCT, PERCENT)
     drivetrain.set_drive_velocity(CONFIG_ROBOT_DRIVE_VEL_PCT, PERCENT)
-    play_audio("initialized.wav", blocking=False)
+    play_audio("initialized.wav", key="progress")
     init_advance(InitStage.INIT_RUNNING)
 
     Thread(robot_render_pos)
     traverse_all()
+    if log_enabled(LogType.LOG_DEBUG):
+        log_event(LogType.LOG_DEBUG, "Path cache: %s", _PATH_CACHE.summary())
+        log_event(LogType.LOG_DEBUG, "Audio: %s", _AUDIO.summary())
+    if CONFIG_TIME_COSTS:
+        _TELEMETRY.save()
+    drain_logs_to_sd()
+    dump_profile()
 
     brain.program_stop() # safe to invoke here
 
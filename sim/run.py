@@ -0,0 +1,175 @@
+#
+# Copyright (c) 2026 Team VMPSADBW
+# All rights reserved.
+#
+# This code is licensed under the BSD 3-Clause License.
+#
+
+# Runs project_3.py's whole mission against the simulated robot in vex.py, and reports how long
+# it took (in virtual time) and where the robot ended up.
+#
+#   python3 sim/run.py                       # operator presses B every 2s
+#   python3 sim/run.py --press B@3000 --every B:500 --quiet --json out.json
+#
+# The field is built from the program's own CONFIG_: the map's edges are walls, every
+# untraversable tile gets a house-sized box, and the robot starts at CONFIG_ROBOT_START_POS.
+#
+# Each run needs a fresh process, as the program (and the simulation) are module-level state.
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SIM_DIR)
+
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import vex # must come before the program, so that it picks this one up
+
+def load_program(path):
+    spec = importlib.util.spec_from_file_location("project_3", path)
+    program = importlib.util.module_from_spec(spec)
+    sys.modules["project_3"] = program
+    spec.loader.exec_module(program) # runs the VEXcode calibration, in virtual time
+    return program
+
+def build_world(program, house_size, sensor_offset):
+    tile = program.CONFIG_MAP_TILE_SIDE_INCHES
+    world = vex.WORLD
+    world.set_field(0, 0, program.CONFIG_MAP_WIDTH * tile, program.CONFIG_MAP_HEIGHT * tile)
+    for weight, x, y in program.CONFIG_MAP_OBSTACLES:
+        if weight < 0:
+            world.add_box(x * tile, y * tile, house_size)
+    world.sensor_offset = sensor_offset
+
+    x, y = program.CONFIG_ROBOT_START_POS
+    world.place(x * tile, y * tile, program.CONFIG_ROBOT_START_ORIENTATION)
+
+# Scripted operator: `presses` are (button, ms) to press once, `every` are (button, ms) to
+# keep pressing with that period
+def start_operator(controller, presses, every):
+    def press_at(button, at):
+        vex.wait(max(at - vex.SCHEDULER.now, 0))
+        controller.press(button)
+
+    def press_every(button, period):
+        while True:
+            vex.wait(period)
+            controller.press(button)
+
+    for button, at in presses:
+        vex.Thread(press_at, (button, at))
+    for button, period in every:
+        vex.Thread(press_every, (button, period))
+
+def parse_press(text, separator):
+    button, _, value = text.partition(separator)
+    return (button, float(value))
+
+# Sets the simulation up as `args` say, and loads the program onto it, ready for `run_main`
+def prepare(args):
+    vex.SCHEDULER.limit_ms = args.limit_s * 1000.0
+    vex.SCHEDULER.cpu_scale = args.cpu_scale
+    vex.WORLD.slip = args.slip
+    vex.WORLD.turn_bias = args.turn_bias
+
+    program = load_program(args.program)
+    program.brain.sdcard.scratch = args.sd_scratch or tempfile.mkdtemp(prefix="sim_sd_")
+    program.brain.screen.echo = args.echo_screen
+    build_world(program, args.house_size, args.sensor_offset)
+
+    presses = [parse_press(p, "@") for p in args.press]
+    every = [parse_press(p, ":") for p in args.every]
+    if not presses and not every:
+        every = [("B", 2000.0)]
+    start_operator(program.controller, presses, every)
+    return program
+
+# Runs the program's main(), returning why it stopped
+def run_main(program):
+    try:
+        program.main()
+    except vex.SimTimeout as e:
+        return "timeout: %s" % e
+    except vex.ProgramStop as e:
+        return str(e)
+    return "returned"
+
+def run(args):
+    stdout = sys.stdout
+    if args.quiet:
+        sys.stdout = open(os.devnull, "w")
+
+    wall_start = time.perf_counter()
+    try:
+        program = prepare(args)
+        stop_reason = run_main(program)
+    finally:
+        wall_ms = (time.perf_counter() - wall_start) * 1000.0
+        if args.quiet:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    world = vex.WORLD
+    tile = program.CONFIG_MAP_TILE_SIDE_INCHES
+    report = {
+        "stop": stop_reason,
+        "virtual_ms": round(vex.SCHEDULER.now, 1),
+        "wall_ms": round(wall_ms, 1),
+        "switches": vex.SCHEDULER.switches,
+        "pose": {
+            "x_tiles": round(world.x / tile, 2),
+            "y_tiles": round(world.y / tile, 2),
+            "heading": round(world.heading(), 1) % 360,
+        },
+        "believed_position": list(program.ROBOT.position) if program.ROBOT else None,
+        "legs_left": len(program._MISSION_LEGS),
+        "travelled_in": round(world.travelled, 1),
+        "turned_deg": round(world.turned, 1),
+        "clips": [[round(at), name] for at, name in program.brain.played],
+        "sd_scratch": program.brain.sdcard.scratch,
+    }
+    return report
+
+# The simulation's knobs, shared with anything else that runs the program this way (bench/)
+def add_arguments(parser):
+    parser.add_argument("--program", default=os.path.join(REPO_DIR, "project_3.py"))
+    parser.add_argument("--press", action="append", default=[], metavar="BUTTON@MS",
+                        help="press BUTTON once, at MS virtual milliseconds")
+    parser.add_argument("--every", action="append", default=[], metavar="BUTTON:MS",
+                        help="keep pressing BUTTON every MS virtual milliseconds (default B:2000)")
+    parser.add_argument("--limit-s", type=float, default=1800, help="give up after this many virtual seconds")
+    parser.add_argument("--slip", type=float, default=0.0, help="fraction of wheel travel lost to slipping")
+    parser.add_argument("--turn-bias", type=float, default=0.0, help="degrees every drivetrain turn overshoots by")
+    parser.add_argument("--cpu-scale", type=float, default=0.0,
+                        help="charge this many virtual ms per ms of host CPU time (0 makes code free)")
+    parser.add_argument("--house-size", type=float, default=12.0, help="side of a house's box, in inches")
+    parser.add_argument("--sensor-offset", type=float, default=6.0,
+                        help="how far ahead of the robot's center the distance sensor is, in inches")
+    parser.add_argument("--sd-scratch", default=None, help="where the program's SD card writes go")
+    parser.add_argument("--echo-screen", action="store_true", help="echo the brain's screen to stdout")
+    parser.add_argument("--quiet", action="store_true", help="hide the program's own output")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run project_3.py's mission in simulation")
+    add_arguments(parser)
+    parser.add_argument("--json", default=None, help="also write the report here")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text + "\n")
+
+    return 0 if report["stop"] == "program_stop" else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+#
+# Copyright (c) 2026 Team VMPSADBW
+# All rights reserved.
+#
+# This code is licensed under the BSD 3-Clause License.
+#
+
+# MicroPython's `urandom`, for running project_3.py off the robot (see vex.py)
+
+from random import choice, getrandbits, randint, random, randrange, seed, uniform
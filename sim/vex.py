@@ -0,0 +1,1018 @@
+#
+# Copyright (c) 2026 Team VMPSADBW
+# All rights reserved.
+#
+# This code is licensed under the BSD 3-Clause License.
+#
+
+# A stand-in for the `vex` module, so that project_3.py can run on a regular computer.
+#
+# Nothing in here talks to hardware. There is one simulated robot driving around an empty
+# field with some boxes (houses) on it, and a virtual clock that only moves forward when every
+# thread is waiting on it. A whole mission then runs as fast as the code itself can go, and it
+# runs the exact same way every time.
+#
+# THREADS
+# The brain's threads are cooperative: one runs until it waits, then whichever is due next goes.
+# We keep that behavior with real Python threads by handing a "baton" between them, so that only
+# the thread holding it ever runs. `wait` queues the caller up again for later and passes the
+# baton to the thread that is due first (which may well be the caller), moving the clock up to
+# that point. Controller callbacks each get a thread of their own, like they do on the brain.
+#
+# ROBOT
+# A differential drive. Each side of the drivetrain moves at whatever its motors were last told
+# to, and the pose is worked out exactly (as an arc) whenever something looks at it. Everything
+# that reads a sensor goes through `WORLD`, so it is also where the field and the robot's pose
+# get set up (see run.py).
+#
+# Only what project_3.py uses is here, with the same names and defaults as the real module.
+#
+# This also has to import under MicroPython's unix port (for bench/), so it sticks to what
+# that has: no os.path, and only _thread, with `threading` used when it's there.
+
+import heapq
+import math
+import os
+import sys
+import time as _time
+
+try:
+    import threading
+
+    _allocate_lock = threading.Lock
+    _get_ident = threading.get_ident
+
+    def _start_thread(fn, name):
+        os_thread = threading.Thread(target=fn, name=name)
+        os_thread.daemon = True
+        os_thread.start()
+except ImportError:
+    import _thread
+
+    _allocate_lock = _thread.allocate_lock
+    _get_ident = _thread.get_ident
+
+    def _start_thread(fn, name):
+        _thread.start_new_thread(fn, ())
+
+# CPU time of the calling thread in seconds, or failing that, wall time
+if hasattr(_time, "thread_time"):
+    _cpu_time = _time.thread_time
+else:
+    _cpu_time = _time.time
+
+def _print_exception(e):
+    if hasattr(sys, "print_exception"):
+        sys.print_exception(e)
+    else:
+        import traceback
+        traceback.print_exc()
+
+def _dirname(path):
+    if "/" not in path:
+        return "."
+    return path.rsplit("/", 1)[0] or "/"
+
+def _isfile(path):
+    try:
+        return os.stat(path)[0] & 0o170000 == 0o100000
+    except OSError:
+        return False
+
+def _makedirs(path):
+    if path in ("", ".", "/") or _isdir(path):
+        return
+    _makedirs(_dirname(path))
+    os.mkdir(path)
+
+def _isdir(path):
+    try:
+        return os.stat(path)[0] & 0o170000 == 0o040000
+    except OSError:
+        return False
+
+#
+# --------- Units and enums ---------
+#
+
+class _Enum:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+class TimeUnits:
+    SECONDS = _Enum("SECONDS")
+    MSEC = _Enum("MSEC")
+
+class RotationUnits:
+    DEG = _Enum("DEG")
+    REV = _Enum("REV")
+
+class VelocityUnits:
+    PERCENT = _Enum("PERCENT")
+    RPM = _Enum("RPM")
+    DPS = _Enum("DPS")
+
+class DistanceUnits:
+    MM = _Enum("MM")
+    IN = _Enum("IN")
+    CM = _Enum("CM")
+
+class DirectionType:
+    FORWARD = _Enum("FORWARD")
+    REVERSE = _Enum("REVERSE")
+
+class TurnType:
+    LEFT = _Enum("LEFT")
+    RIGHT = _Enum("RIGHT")
+
+class AxisType:
+    XAXIS = _Enum("XAXIS")
+    YAXIS = _Enum("YAXIS")
+    ZAXIS = _Enum("ZAXIS")
+
+class BrakeType:
+    COAST = _Enum("COAST")
+    BRAKE = _Enum("BRAKE")
+    HOLD = _Enum("HOLD")
+
+class TemperatureUnits:
+    CELSIUS = _Enum("CELSIUS")
+    FAHRENHEIT = _Enum("FAHRENHEIT")
+
+class FontType:
+    MONO12 = _Enum("MONO12")
+    MONO15 = _Enum("MONO15")
+    MONO20 = _Enum("MONO20")
+    MONO30 = _Enum("MONO30")
+    MONO40 = _Enum("MONO40")
+    MONO60 = _Enum("MONO60")
+    PROP20 = _Enum("PROP20")
+    PROP30 = _Enum("PROP30")
+    PROP40 = _Enum("PROP40")
+    PROP60 = _Enum("PROP60")
+
+class Ports:
+    pass
+
+for _port in range(1, 22):
+    setattr(Ports, "PORT%d" % _port, _port)
+
+SECONDS = TimeUnits.SECONDS
+MSEC = TimeUnits.MSEC
+DEGREES = RotationUnits.DEG
+TURNS = RotationUnits.REV
+PERCENT = VelocityUnits.PERCENT
+RPM = VelocityUnits.RPM
+DPS = VelocityUnits.DPS
+MM = DistanceUnits.MM
+INCHES = DistanceUnits.IN
+CM = DistanceUnits.CM
+FORWARD = DirectionType.FORWARD
+REVERSE = DirectionType.REVERSE
+LEFT = TurnType.LEFT
+RIGHT = TurnType.RIGHT
+XAXIS = AxisType.XAXIS
+YAXIS = AxisType.YAXIS
+ZAXIS = AxisType.ZAXIS
+COAST = BrakeType.COAST
+BRAKE = BrakeType.BRAKE
+HOLD = BrakeType.HOLD
+
+def _to_ms(value, units):
+    if units is SECONDS:
+        return value * 1000.0
+    return float(value)
+
+def _to_inches(value, units):
+    if units is MM:
+        return value / 25.4
+    if units is CM:
+        return value / 2.54
+    return float(value)
+
+def _from_inches(value, units):
+    if units is MM:
+        return value * 25.4
+    if units is CM:
+        return value * 2.54
+    return value
+
+def _to_degrees(value, units):
+    if units is TURNS:
+        return value * 360.0
+    return float(value)
+
+def _from_degrees(value, units):
+    if units is TURNS:
+        return value / 360.0
+    return value
+
+_MAX_RPM = 200.0 # green cartridge
+
+def _to_percent(value, units):
+    if units is RPM:
+        return value * 100.0 / _MAX_RPM
+    if units is DPS:
+        return value * 100.0 / (_MAX_RPM * 6)
+    return float(value)
+
+# Into [0, 360), which `%` alone doesn't quite do for tiny negative floats
+def _wrap_degrees(value):
+    value = value % 360.0
+    if value >= 360.0:
+        return 0.0
+    return value
+
+def _clamp_percent(value):
+    return max(-100.0, min(100.0, value))
+
+#
+# --------- Virtual clock and threads ---------
+#
+
+# Raised out of `brain.program_stop()`, and then out of every other thread's next `wait`, to
+# unwind the whole program. Whoever is running the simulation catches it from the main thread.
+class ProgramStop(Exception):
+    pass
+
+# Raised instead of ProgramStop when the clock runs past `SCHEDULER.limit_ms`
+class SimTimeout(ProgramStop):
+    pass
+
+class _SimThread:
+    def __init__(self, name):
+        self.name = name
+        self.baton = _allocate_lock() # held by someone else whenever it's not our turn
+        self.baton.acquire()
+        self.alive = True
+        self.stopped = False
+        self.cpu_mark = 0.0
+
+class _Scheduler:
+    def __init__(self):
+        self.now = 0.0 # virtual ms
+        self.queue = [] # heap of (wake ms, seq, _SimThread)
+        self.seq = 0
+        self.threads = {} # OS thread id -> _SimThread
+        self.main = None
+        self.stopping = None # the exception every thread raises as it gets the baton back
+        self.limit_ms = None
+        self.cpu_scale = 0.0 # virtual ms charged per ms of real CPU time between waits
+        self.switches = 0
+
+    # The thread that imports this module is the program's main thread
+    def adopt_main(self):
+        self.main = _SimThread("main")
+        self.main.cpu_mark = _cpu_time()
+        self.threads[_get_ident()] = self.main
+
+    def current(self):
+        return self.threads[_get_ident()]
+
+    def _queue(self, thread, at):
+        heapq.heappush(self.queue, (at, self.seq, thread))
+        self.seq += 1
+
+    def spawn(self, fn, args, name):
+        thread = _SimThread(name)
+
+        def bootstrap():
+            self.threads[_get_ident()] = thread
+            thread.baton.acquire()
+            thread.cpu_mark = _cpu_time()
+            try:
+                self._check_stop(thread)
+                fn(*args)
+            except ProgramStop:
+                pass
+            except Exception as e:
+                # the brain prints these and carries on without the thread
+                _print_exception(e)
+            thread.alive = False
+            self.threads.pop(_get_ident(), None)
+            self._hand_off(thread)
+
+        self._queue(thread, self.now)
+        _start_thread(bootstrap, name)
+        return thread
+
+    # Moves the clock on by the CPU time the running thread has used since it last did this (or
+    # last waited), so that timing code that never waits still sees it cost something
+    def charge(self):
+        thread = self.current()
+        if self.cpu_scale:
+            mark = _cpu_time()
+            self.now += (mark - thread.cpu_mark) * 1000.0 * self.cpu_scale
+            thread.cpu_mark = mark
+        return self.now
+
+    def wait(self, ms):
+        thread = self.current()
+        self.charge()
+
+        self._queue(thread, self.now + max(ms, 0.0))
+        self._hand_off(thread)
+        self._check_stop(thread)
+        thread.cpu_mark = _cpu_time()
+
+    # Gives the baton to whoever is due next, and (unless `thread` is done for good) blocks
+    # until it comes back around
+    def _hand_off(self, thread):
+        at, _, due = heapq.heappop(self.queue)
+        if at > self.now:
+            self.now = at
+        if self.limit_ms is not None and self.now > self.limit_ms and self.stopping is None:
+            self.stopping = SimTimeout("ran past %.0f ms" % self.limit_ms)
+
+        if due is thread:
+            return
+        self.switches += 1
+        due.baton.release()
+        if thread.alive:
+            thread.baton.acquire()
+
+    def _check_stop(self, thread):
+        if self.stopping is not None:
+            raise self.stopping
+        if thread.stopped:
+            raise ProgramStop("thread stopped")
+
+    def stop(self, exception):
+        if self.stopping is None:
+            self.stopping = exception
+        raise self.stopping
+
+SCHEDULER = _Scheduler()
+SCHEDULER.adopt_main()
+
+def wait(time, units = MSEC):
+    SCHEDULER.wait(_to_ms(time, units))
+
+def sleep(time, units = MSEC):
+    SCHEDULER.wait(_to_ms(time, units))
+
+class Thread:
+    def __init__(self, callback, args = ()):
+        self._thread = SCHEDULER.spawn(callback, args, getattr(callback, "__name__", "thread"))
+
+    def stop(self):
+        self._thread.stopped = True
+
+#
+# --------- The simulated world ---------
+#
+
+_INF = float("inf")
+_DISTANCE_NONE_MM = 9999 # what the distance sensor reads when it sees nothing
+
+class _World:
+    def __init__(self):
+        self.x = 0.0 # inches
+        self.y = 0.0
+        self.rotation = 0.0 # degrees clockwise from north, not wrapped
+        self.t = 0.0 # ms, when the pose was last brought up to date
+
+        self.left = None # MotorGroups of the drivetrain, see SmartDrive
+        self.right = None
+        self.wheel_travel = 319.19 / 25.4 # inches per wheel turn
+        self.track_width = 320 / 25.4
+
+        # How far off a real robot would be. `slip` is the part of wheel travel that doesn't
+        # move the robot, and `turn_bias` is how far each drivetrain turn overshoots, in degrees
+        self.slip = 0.0
+        self.turn_bias = 0.0
+
+        self.field = None # (x0, y0, x1, y1) walls, in inches
+        self.boxes = [] # (x0, y0, x1, y1) obstacles, in inches
+        self.sensor_offset = 0.0 # how far forward of the robot's center the distance sensor is
+        self.sensor_range = 2000 / 25.4
+
+        self.travelled = 0.0 # total inches driven, either direction
+        self.turned = 0.0 # total degrees turned, either direction
+
+    def place(self, x, y, heading):
+        self.sync()
+        self.x = float(x)
+        self.y = float(y)
+        self.rotation = float(heading)
+
+    def set_field(self, x0, y0, x1, y1):
+        self.field = (x0, y0, x1, y1)
+
+    def add_box(self, x, y, size):
+        half = size / 2.0
+        self.boxes.append((x - half, y - half, x + half, y + half))
+
+    # Inches per second a side goes at, with its motors at `percent`
+    def speed_of(self, percent):
+        return _clamp_percent(percent) / 100.0 * _MAX_RPM / 60.0 * self.wheel_travel
+
+    def _side_speed(self, group):
+        if group is None:
+            return 0.0
+        return self.speed_of(group._speed)
+
+    # Moves the robot along to the current time, at the speeds its sides have been going at
+    def sync(self):
+        now = SCHEDULER.now
+        dt = (now - self.t) / 1000.0
+        self.t = now
+        if dt <= 0:
+            return
+
+        left = self._side_speed(self.left) * dt * (1.0 - self.slip)
+        right = self._side_speed(self.right) * dt * (1.0 - self.slip)
+        distance = (left + right) / 2.0
+        turned = (left - right) / self.track_width # radians, clockwise
+        heading = math.radians(self.rotation)
+
+        if abs(turned) < 1e-9:
+            self.x += distance * math.sin(heading)
+            self.y += distance * math.cos(heading)
+        else:
+            radius = distance / turned
+            self.x += radius * (math.cos(heading) - math.cos(heading + turned))
+            self.y += radius * (math.sin(heading + turned) - math.sin(heading))
+
+        self.rotation += math.degrees(turned)
+        self.travelled += abs(distance)
+        self.turned += abs(math.degrees(turned))
+
+        # the walls don't give, so driving into one just pushes the robot up against it
+        if self.field is not None:
+            x0, y0, x1, y1 = self.field
+            self.x = min(max(self.x, x0), x1)
+            self.y = min(max(self.y, y0), y1)
+
+    def heading(self):
+        self.sync()
+        return _wrap_degrees(self.rotation)
+
+    # Distance in inches from the sensor to whatever it's pointing at, or None if there's
+    # nothing in range
+    def raycast(self):
+        self.sync()
+        heading = math.radians(self.rotation)
+        dx = math.sin(heading)
+        dy = math.cos(heading)
+        ox = self.x + dx * self.sensor_offset
+        oy = self.y + dy * self.sensor_offset
+
+        best = None
+        for box in self.boxes:
+            hit = _ray_box(ox, oy, dx, dy, box, False)
+            if hit is not None and (best is None or hit < best):
+                best = hit
+        if self.field is not None:
+            hit = _ray_box(ox, oy, dx, dy, self.field, True)
+            if hit is None:
+                hit = 0.0 # the sensor itself is up against (or past) a wall
+            if best is None or hit < best:
+                best = hit
+
+        if best is None or best > self.sensor_range:
+            return None
+        return best
+
+# How far along the ray (ox, oy) + t * (dx, dy) it hits the edge of `box`. From the outside
+# that's where it goes in, and from the `inside` (i.e. the field walls) it's where it comes out
+def _ray_box(ox, oy, dx, dy, box, inside):
+    x0, y0, x1, y1 = box
+    t_near = -_INF
+    t_far = _INF
+    for origin, direction, low, high in ((ox, dx, x0, x1), (oy, dy, y0, y1)):
+        if abs(direction) < 1e-12:
+            if origin < low or origin > high:
+                return None
+            continue
+        t0 = (low - origin) / direction
+        t1 = (high - origin) / direction
+        if t0 > t1:
+            t0, t1 = t1, t0
+        t_near = max(t_near, t0)
+        t_far = min(t_far, t1)
+
+    if t_near > t_far or t_far < 0:
+        return None
+    if inside:
+        return t_far
+    if t_near < 0:
+        return 0.0 # we're in it
+    return t_near
+
+WORLD = _World()
+
+#
+# --------- Devices ---------
+#
+
+class _Timer:
+    def __init__(self):
+        self.start = 0.0
+
+    def time(self, units = MSEC):
+        elapsed = SCHEDULER.now - self.start
+        if units is SECONDS:
+            return elapsed / 1000.0
+        return elapsed
+
+    def value(self):
+        return (SCHEDULER.now - self.start) / 1000.0
+
+    def clear(self):
+        self.start = SCHEDULER.now
+
+    def reset(self):
+        self.clear()
+
+    def system(self):
+        return int(SCHEDULER.now)
+
+    def system_high_res(self):
+        return int(SCHEDULER.now * 1000)
+
+# Keeps what would be on the screen as rows of text. With `echo` set, everything printed to
+# it also goes to stdout.
+class _Screen:
+    def __init__(self):
+        self.rows = {}
+        self.cursor_row = 1
+        self.cursor_column = 1
+        self.echo = False
+
+    def print(self, *args, sep = " "):
+        text = sep.join([str(arg) for arg in args])
+        line = self.rows.get(self.cursor_row, "")
+        column = self.cursor_column - 1
+        if len(line) < column:
+            line += " " * (column - len(line))
+        self.rows[self.cursor_row] = line[:column] + text + line[column + len(text):]
+        self.cursor_column += len(text)
+        if self.echo:
+            print("[screen %d] %s" % (self.cursor_row, text))
+
+    def next_row(self):
+        self.cursor_row += 1
+        self.cursor_column = 1
+
+    def set_cursor(self, row, column):
+        self.cursor_row = row
+        self.cursor_column = column
+
+    def row(self):
+        return self.cursor_row
+
+    def column(self):
+        return self.cursor_column
+
+    def clear_screen(self, color = None):
+        self.rows = {}
+        self.cursor_row = 1
+        self.cursor_column = 1
+
+    def clear_row(self, row = None, color = None):
+        self.rows.pop(self.cursor_row if row is None else row, None)
+
+    def set_font(self, font):
+        pass
+
+    def set_pen_color(self, color):
+        pass
+
+    def render(self):
+        return True
+
+# The SD card reads from `root` (by default the repo's audio/, which is what gets copied onto
+# the card), and anything the program writes goes to `scratch` instead, so running the
+# simulation never touches the repo. Reads see the scratch copy first.
+class _SDCard:
+    def __init__(self):
+        self.root = _dirname(_dirname(__file__)) + "/audio"
+        self.scratch = None
+
+    def _find(self, name):
+        for directory in (self.scratch, self.root):
+            if directory is None:
+                continue
+            path = directory + "/" + name
+            if _isfile(path):
+                return path
+        return None
+
+    def is_inserted(self):
+        return True
+
+    def exists(self, *names):
+        for name in names:
+            if self._find(name) is None:
+                return False
+        return True
+
+    def filesize(self, name):
+        path = self._find(name)
+        if path is None:
+            return 0
+        return os.stat(path)[6]
+
+    def size(self, name):
+        return self.filesize(name)
+
+    # With a buffer, only reads as much of the file as fits in it
+    def loadfile(self, name, buffer = None):
+        path = self._find(name)
+        if path is None:
+            return bytearray()
+        with open(path, "rb") as f:
+            if buffer is not None:
+                return bytearray(f.read(len(buffer)))
+            return bytearray(f.read())
+
+    def _write(self, name, data, mode):
+        if self.scratch is None:
+            return 0
+        path = self.scratch + "/" + name
+        _makedirs(_dirname(path))
+        with open(path, mode) as f:
+            f.write(bytes(data))
+        return len(data)
+
+    def savefile(self, name, data):
+        return self._write(name, data, "wb")
+
+    def appendfile(self, name, data):
+        return self._write(name, data, "ab")
+
+class _Battery:
+    def capacity(self, *args):
+        return 100
+
+    def temperature(self, units = TemperatureUnits.CELSIUS):
+        if units is TemperatureUnits.FAHRENHEIT:
+            return 77.0
+        return 25.0
+
+    def voltage(self, *args):
+        return 12.8
+
+    def current(self, *args):
+        return 1.0
+
+_WAV_DURATIONS = {} # path -> ms
+
+# How long a WAV file plays for, from its header: the size of its "data" chunk over the byte
+# rate in its "fmt " chunk. Anything that doesn't parse plays for no time at all.
+def _wav_duration_ms(path):
+    duration = _WAV_DURATIONS.get(path)
+    if duration is not None:
+        return duration
+
+    with open(path, "rb") as f:
+        data = f.read()
+    duration = 0.0
+    byte_rate = 0
+    offset = 12 # past "RIFF", the size, and "WAVE"
+    if data[0:4] == b"RIFF" and data[8:12] == b"WAVE":
+        while offset + 8 <= len(data):
+            chunk = data[offset:offset + 4]
+            size = _le32(data, offset + 4)
+            if chunk == b"fmt ":
+                byte_rate = _le32(data, offset + 16)
+            elif chunk == b"data" and byte_rate > 0:
+                duration = size * 1000.0 / byte_rate
+                break
+            offset += 8 + size + (size & 1)
+
+    _WAV_DURATIONS[path] = duration
+    return duration
+
+def _le32(data, offset):
+    return data[offset] | (data[offset + 1] << 8) | (data[offset + 2] << 16) | (data[offset + 3] << 24)
+
+class Brain:
+    def __init__(self):
+        self.screen = _Screen()
+        self.timer = _Timer()
+        self.sdcard = _SDCard()
+        self.battery = _Battery()
+        self.sound_until = 0.0 # ms the clip playing right now ends at
+        self.played = [] # (ms, file name) of every clip started
+
+    def play_file(self, name, volume = 100):
+        path = self.sdcard._find(name)
+        if path is None:
+            return
+        self.played.append((SCHEDULER.now, name))
+        self.sound_until = SCHEDULER.now + _wav_duration_ms(path)
+
+    def play_sound(self, *args):
+        pass
+
+    def play_note(self, *args):
+        pass
+
+    def sound_is_active(self):
+        return SCHEDULER.now < self.sound_until
+
+    def sound_off(self):
+        self.sound_until = SCHEDULER.now
+
+    def program_stop(self):
+        SCHEDULER.stop(ProgramStop("program_stop"))
+
+class Inertial:
+    CALIBRATION_MS = 2000 # about how long the real sensor takes
+
+    def __init__(self, port = None):
+        self.heading_offset = 0.0
+        self.rotation_offset = 0.0
+        self.calibrating_until = 0.0
+
+    def calibrate(self):
+        self.calibrating_until = SCHEDULER.now + Inertial.CALIBRATION_MS
+
+    def is_calibrating(self):
+        return SCHEDULER.now < self.calibrating_until
+
+    def installed(self):
+        return True
+
+    def heading(self, units = DEGREES):
+        return _from_degrees(_wrap_degrees(WORLD.heading() + self.heading_offset), units)
+
+    def rotation(self, units = DEGREES):
+        WORLD.sync()
+        return _from_degrees(WORLD.rotation + self.rotation_offset, units)
+
+    def set_heading(self, value, units = DEGREES):
+        self.heading_offset = _to_degrees(value, units) - WORLD.heading()
+
+    def set_rotation(self, value, units = DEGREES):
+        WORLD.sync()
+        self.rotation_offset = _to_degrees(value, units) - WORLD.rotation
+
+    def reset_heading(self):
+        self.set_heading(0)
+
+    def reset_rotation(self):
+        self.set_rotation(0)
+
+    def acceleration(self, axis):
+        if axis is ZAXIS:
+            return -1.0
+        return 0.0
+
+    def gyro_rate(self, axis, units = VelocityUnits.DPS):
+        if axis is not ZAXIS or WORLD.left is None:
+            return 0.0
+        left = WORLD._side_speed(WORLD.left)
+        right = WORLD._side_speed(WORLD.right)
+        return math.degrees((left - right) / WORLD.track_width)
+
+class Motor:
+    def __init__(self, port = None, *args):
+        self.port = port
+        self._velocity = 50.0 # percent it spins at when told to spin, the brain's default
+        self._speed = 0.0 # percent it's actually spinning at, signed
+        self._position = 0.0 # degrees, as of self._t
+        self._t = 0.0
+
+    def _sync(self):
+        now = SCHEDULER.now
+        self._position += self._speed / 100.0 * _MAX_RPM * 6.0 * (now - self._t) / 1000.0
+        self._t = now
+
+    def _set_speed(self, speed):
+        self._sync()
+        self._speed = _clamp_percent(speed)
+
+    def set_velocity(self, value, units = PERCENT):
+        self._velocity = _to_percent(value, units)
+        if self._speed != 0:
+            self._set_speed(self._velocity if self._speed > 0 else -self._velocity)
+
+    def set_stopping(self, mode):
+        pass
+
+    def spin(self, direction, velocity = None, units = PERCENT):
+        if velocity is not None:
+            self._velocity = _to_percent(velocity, units)
+        self._set_speed(self._velocity if direction is FORWARD else -self._velocity)
+
+    def stop(self, mode = None):
+        self._set_speed(0.0)
+
+    def spin_for(self, direction, angle, units = DEGREES, velocity = None, units_v = PERCENT, wait = True):
+        if velocity is not None:
+            self._velocity = _to_percent(velocity, units_v)
+        degrees = _to_degrees(angle, units)
+        if degrees < 0:
+            degrees = -degrees
+            direction = REVERSE if direction is FORWARD else FORWARD
+
+        self.spin(direction)
+        speed = abs(self._speed) / 100.0 * _MAX_RPM * 6.0 / 1000.0 # degrees per ms
+        duration = degrees / speed if speed > 0 else 0.0
+        if wait:
+            SCHEDULER.wait(duration)
+            self.stop()
+        else:
+            def stop_later():
+                SCHEDULER.wait(duration)
+                self.stop()
+            Thread(stop_later)
+
+    def position(self, units = DEGREES):
+        self._sync()
+        return _from_degrees(self._position, units)
+
+    def set_position(self, value, units = DEGREES):
+        self._sync()
+        self._position = _to_degrees(value, units)
+
+    def velocity(self, units = PERCENT):
+        if units is RPM:
+            return self._speed / 100.0 * _MAX_RPM
+        return self._speed
+
+    def is_spinning(self):
+        return self._speed != 0
+
+    def is_done(self):
+        return self._speed == 0
+
+class MotorGroup(Motor):
+    def __init__(self, *motors):
+        Motor.__init__(self)
+        self.motors = motors
+
+    # The drivetrain's groups move the robot, so the world has to catch up before they change
+    def _set_speed(self, speed):
+        if self is WORLD.left or self is WORLD.right:
+            WORLD.sync()
+        Motor._set_speed(self, speed)
+
+class SmartDrive:
+    def __init__(self, left, right, gyro, wheel_travel = 300, track_width = 320, wheel_base = 320,
+                 units = MM, gear_ratio = 1.0):
+        self.left = left
+        self.right = right
+        self.gyro = gyro
+        self.drive_velocity = 50.0
+        self.turn_velocity = 50.0
+
+        WORLD.sync()
+        WORLD.left = left
+        WORLD.right = right
+        WORLD.wheel_travel = _to_inches(wheel_travel, units) / gear_ratio
+        WORLD.track_width = _to_inches(track_width, units)
+
+    def set_drive_velocity(self, value, units = PERCENT):
+        self.drive_velocity = _to_percent(value, units)
+
+    def set_turn_velocity(self, value, units = PERCENT):
+        self.turn_velocity = _to_percent(value, units)
+
+    def set_stopping(self, mode):
+        pass
+
+    def _run(self, left_speed, right_speed, duration, wait):
+        self.left._set_speed(left_speed)
+        self.right._set_speed(right_speed)
+        if wait:
+            SCHEDULER.wait(duration)
+            self.stop()
+        else:
+            def stop_later():
+                SCHEDULER.wait(duration)
+                self.stop()
+            Thread(stop_later)
+
+    # project_3.py relies on distances defaulting to inches
+    def drive_for(self, direction, distance, units = INCHES, velocity = None, units_v = PERCENT, wait = True):
+        speed = self.drive_velocity if velocity is None else _to_percent(velocity, units_v)
+        inches = _to_inches(distance, units)
+        if inches < 0:
+            inches = -inches
+            direction = REVERSE if direction is FORWARD else FORWARD
+        if direction is REVERSE:
+            speed = -speed
+
+        inches_per_ms = abs(WORLD.speed_of(speed)) / 1000.0
+        duration = inches / inches_per_ms if inches_per_ms > 0 else 0.0
+        self._run(speed, speed, duration, wait)
+
+    def turn_for(self, direction, angle, units = DEGREES, velocity = None, units_v = PERCENT, wait = True):
+        speed = self.turn_velocity if velocity is None else _to_percent(velocity, units_v)
+        degrees = _to_degrees(angle, units)
+        if direction is LEFT:
+            degrees = -degrees
+        if degrees < 0:
+            speed = -speed
+            degrees = -degrees - WORLD.turn_bias
+        else:
+            degrees = degrees + WORLD.turn_bias
+        degrees = max(degrees, 0.0)
+
+        # both sides going opposite ways at `speed` spins the robot on the spot
+        degrees_per_ms = math.degrees(2 * abs(WORLD.speed_of(speed)) / WORLD.track_width) / 1000.0
+        duration = degrees / degrees_per_ms if degrees_per_ms > 0 else 0.0
+        self._run(speed, -speed, duration, wait)
+
+    def drive(self, direction, velocity = None, units = PERCENT):
+        speed = self.drive_velocity if velocity is None else _to_percent(velocity, units)
+        if direction is REVERSE:
+            speed = -speed
+        self.left._set_speed(speed)
+        self.right._set_speed(speed)
+
+    def stop(self, mode = None):
+        self.left._set_speed(0.0)
+        self.right._set_speed(0.0)
+
+    def heading(self, units = DEGREES):
+        return self.gyro.heading(units)
+
+    def rotation(self, units = DEGREES):
+        return self.gyro.rotation(units)
+
+    def set_heading(self, value, units = DEGREES):
+        self.gyro.set_heading(value, units)
+
+    def set_rotation(self, value, units = DEGREES):
+        self.gyro.set_rotation(value, units)
+
+    def is_moving(self):
+        return self.left._speed != 0 or self.right._speed != 0
+
+    def is_done(self):
+        return not self.is_moving()
+
+class Distance:
+    def __init__(self, port = None):
+        self.port = port
+
+    def object_distance(self, units = MM):
+        inches = WORLD.raycast()
+        if inches is None:
+            return _from_inches(_DISTANCE_NONE_MM / 25.4, units)
+        return _from_inches(inches, units)
+
+    def is_object_detected(self):
+        return WORLD.raycast() is not None
+
+    def object_size(self):
+        return 0
+
+    def object_velocity(self):
+        return 0.0
+
+    def installed(self):
+        return True
+
+class _Button:
+    def __init__(self, name):
+        self.name = name
+        self.on_pressed = []
+        self.on_released = []
+        self.is_pressing = False
+
+    def pressed(self, callback, args = ()):
+        self.on_pressed.append((callback, args))
+
+    def released(self, callback, args = ()):
+        self.on_released.append((callback, args))
+
+    def pressing(self):
+        return self.is_pressing
+
+class _Axis:
+    def position(self, units = PERCENT):
+        return 0
+
+    def changed(self, callback, args = ()):
+        pass
+
+_BUTTONS = ("A", "B", "X", "Y", "Up", "Down", "Left", "Right", "L1", "L2", "L3", "R1", "R2", "R3")
+
+class Controller:
+    def __init__(self, *args):
+        for name in _BUTTONS:
+            setattr(self, "button" + name, _Button(name))
+        for number in range(1, 5):
+            setattr(self, "axis%d" % number, _Axis())
+        self.screen = _Screen()
+
+    # Not part of the real API: presses (and lets go of) a button, running everything
+    # registered on it, each on its own thread
+    def press(self, name):
+        button = getattr(self, "button" + name)
+        for callback, args in button.on_pressed:
+            Thread(callback, args)
+        for callback, args in button.on_released:
+            Thread(callback, args)
+
+    def rumble(self, pattern):
+        pass
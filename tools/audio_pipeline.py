@@ -0,0 +1,323 @@
+#
+# Copyright (c) 2026 Team VMPSADBW
+# All rights reserved.
+#
+# This code is licensed under the BSD 3-Clause License.
+#
+
+# Audio pipeline: gets clips ready for the robot's SD card, and writes a manifest of how long
+# each one is.
+#
+#   python3 tools/audio_pipeline.py [--src audio] [--out audio] [--jobs N] [--force]
+#
+# Every .wav (and .mp3, if ffmpeg is around to decode it) in --src comes out in --out as a
+# 16kHz mono 16 bit WAV with a plain 44 byte header, which is what the brain plays and what
+# AudioManifest in project_3.py reads lengths from. On the way it's
+#   resampled   with a windowed sinc, so that clips at any rate keep their pitch and length
+#   downmixed   channels are averaged
+#   trimmed     silence at either end goes, but for --pad-ms. Shorter clips load faster and are
+#               done sooner, so the next one can start
+#   normalised  to --loudness dBFS, going by the RMS of the parts that aren't silent, but never
+#               past --ceiling dBFS at the peaks
+#
+# Clips are worked on in parallel, one process each, and a clip whose source and settings are
+# the same as last time is skipped, going by the hashes in --out's .pipeline-cache.json. That
+# includes running it in place (the default), where the source is the last run's output.
+#
+# Only needs the standard library (and ffmpeg, for MP3s).
+
+import argparse
+import array
+import concurrent.futures
+import hashlib
+import io
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import wave
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUDIO_DIR = os.path.join(REPO_DIR, "audio")
+
+CACHE_FILE = ".pipeline-cache.json"
+MANIFEST_FILE = "manifest.json"
+
+OUT_RATE = 16000
+ZERO_CROSSINGS = 16 # half the width of the resampling filter, in (filter) zero crossings
+WINDOW_MS = 10 # silence and loudness are measured over windows this long
+FADE_MS = 5 # trimmed ends fade in/out over this long, so they don't click
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def db_to_gain(db):
+    return 10.0 ** (db / 20.0)
+
+def gain_to_db(gain):
+    return 20.0 * math.log10(gain) if gain > 0 else -200.0
+
+# (samples in [-1, 1], one list per channel, sample rate) of a WAV file's contents
+def decode_wav(data):
+    with wave.open(io.BytesIO(data), "rb") as f:
+        channels = f.getnchannels()
+        width = f.getsampwidth()
+        rate = f.getframerate()
+        frames = f.readframes(f.getnframes())
+
+    if width == 1: # unsigned
+        values = [b - 128 for b in frames]
+    elif width == 3:
+        values = []
+        for i in range(0, len(frames) - 2, 3):
+            value = frames[i] | (frames[i + 1] << 8) | (frames[i + 2] << 16)
+            values.append(value - (1 << 24) if value & 0x800000 else value)
+    else:
+        values = array.array({2: "h", 4: "i"}[width])
+        values.frombytes(frames)
+        if sys.byteorder == "big":
+            values.byteswap()
+
+    scale = 1.0 / (1 << (8 * width - 1))
+    return [[v * scale for v in values[c::channels]] for c in range(channels)], rate
+
+def decode(path):
+    if path.lower().endswith(".mp3"):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("decoding MP3s needs ffmpeg")
+        data = subprocess.run(["ffmpeg", "-v", "error", "-i", path, "-f", "wav", "-"],
+                              check=True, stdout=subprocess.PIPE).stdout
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+    return decode_wav(data)
+
+def downmix(channels):
+    if len(channels) == 1:
+        return channels[0]
+    scale = 1.0 / len(channels)
+    return [sum(frame) * scale for frame in zip(*channels)]
+
+# Band limited resampling, with a Blackman windowed sinc. The cutoff sits a little under the
+# lower of the two Nyquist frequencies, so downsampling doesn't alias.
+def resample(samples, src_rate, dst_rate):
+    if src_rate == dst_rate or not samples:
+        return samples
+
+    ratio = dst_rate / src_rate
+    cutoff = min(1.0, ratio) * 0.95 # in cycles per source sample, times two
+    half_width = ZERO_CROSSINGS / cutoff # in source samples
+    reach = int(half_width)
+    count = len(samples)
+
+    out = []
+    for i in range(int(count * ratio)):
+        t = i / ratio
+        center = int(t)
+        total = 0.0
+        for j in range(max(center - reach, 0), min(center + reach + 1, count)):
+            x = t - j
+            if x == 0.0:
+                tap = cutoff
+            else:
+                phase = math.pi * cutoff * x
+                tap = cutoff * math.sin(phase) / phase
+            w = math.pi * x / half_width
+            total += samples[j] * tap * (0.42 + 0.5 * math.cos(w) + 0.08 * math.cos(2 * w))
+        out.append(total)
+    return out
+
+# RMS of every WINDOW_MS window, in dBFS
+def window_levels(samples, rate):
+    size = max(rate * WINDOW_MS // 1000, 1)
+    levels = []
+    for start in range(0, len(samples), size):
+        window = samples[start:start + size]
+        power = sum([s * s for s in window]) / len(window)
+        levels.append(gain_to_db(math.sqrt(power)))
+    return levels, size
+
+# Cuts everything before the first and after the last window louder than `silence_db`, but for
+# `pad_ms` either side. A clip that's silent all the way through is left alone.
+def trim(samples, rate, silence_db, pad_ms):
+    levels, size = window_levels(samples, rate)
+    loud = [i for i in range(len(levels)) if levels[i] > silence_db]
+    if not loud:
+        return samples
+
+    pad = rate * pad_ms // 1000
+    count = len(samples)
+    start = max(loud[0] * size - pad, 0)
+    end = min((loud[-1] + 1) * size + pad, count)
+    samples = samples[start:end]
+
+    fade = min(rate * FADE_MS // 1000, len(samples) // 2)
+    for i in range(fade):
+        scale = i / fade
+        if start > 0:
+            samples[i] *= scale
+        if end < count:
+            samples[-1 - i] *= scale
+    return samples
+
+# Gain (in dB) that brings the clip's loudness to `loudness_db`, without any peak going past
+# `ceiling_db`. Loudness is the RMS of the windows that aren't silence, so a clip with a lot of
+# gaps isn't pushed any louder than one without.
+def normalise_gain(samples, rate, silence_db, loudness_db, ceiling_db):
+    levels, _ = window_levels(samples, rate)
+    loud = [db_to_gain(level) for level in levels if level > silence_db]
+    if not loud:
+        return 0.0
+
+    rms = math.sqrt(sum([g * g for g in loud]) / len(loud))
+    peak = max([abs(s) for s in samples])
+    return min(loudness_db - gain_to_db(rms), ceiling_db - gain_to_db(peak))
+
+def encode_wav(samples, gain_db):
+    gain = db_to_gain(gain_db)
+    values = array.array("h", [max(-32768, min(32767, int(round(s * gain * 32767)))) for s in samples])
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    out = io.BytesIO()
+    with wave.open(out, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(OUT_RATE)
+        f.writeframes(values.tobytes())
+    return out.getvalue()
+
+# Runs in a worker process: processes one clip, writing it out (atomically, as --src and --out
+# may well be the same directory)
+def process(src_path, out_path, settings):
+    channels, rate = decode(src_path)
+    samples = resample(downmix(channels), rate, OUT_RATE)
+    before_ms = len(samples) * 1000 // OUT_RATE
+    samples = trim(samples, OUT_RATE, settings["silence_db"], settings["pad_ms"])
+    gain_db = normalise_gain(samples, OUT_RATE, settings["silence_db"], settings["loudness_db"], settings["ceiling_db"])
+    data = encode_wav(samples, gain_db)
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, out_path)
+
+    return {
+        "duration_ms": len(samples) * 1000 // OUT_RATE,
+        "trimmed_ms": before_ms - len(samples) * 1000 // OUT_RATE,
+        "gain_db": round(gain_db, 1),
+        "output": hashlib.sha1(data).hexdigest(),
+    }
+
+# {clip name: source path}. An MP3 is the original of the WAV with the same name.
+def find_sources(src_dir):
+    sources = {}
+    for name in sorted(os.listdir(src_dir)):
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        if ext == ".mp3" or (ext == ".wav" and stem + ".wav" not in sources):
+            sources[stem + ".wav"] = os.path.join(src_dir, name)
+    return sources
+
+def load_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def write_json(path, value):
+    with open(path, "w") as f:
+        f.write(json.dumps(value, indent=2, sort_keys=True) + "\n")
+
+def wav_duration_ms(path):
+    with wave.open(path, "rb") as f:
+        return f.getnframes() * 1000 // f.getframerate()
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert, trim and normalise the robot's audio clips")
+    parser.add_argument("--src", default=AUDIO_DIR, help="where the clips come from (default audio/)")
+    parser.add_argument("--out", default=None, help="where they go (default: same as --src)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="processes to use")
+    parser.add_argument("--force", action="store_true", help="process every clip, even unchanged ones")
+    parser.add_argument("--loudness", dest="loudness_db", type=float, default=-10.0,
+                        help="target loudness in dBFS RMS (default -10)")
+    parser.add_argument("--ceiling", dest="ceiling_db", type=float, default=-1.0,
+                        help="loudest any peak may get, in dBFS (default -1)")
+    parser.add_argument("--silence", dest="silence_db", type=float, default=-45.0,
+                        help="windows quieter than this (dBFS) count as silence (default -45)")
+    parser.add_argument("--pad-ms", type=int, default=30, help="silence kept at either end (default 30)")
+    args = parser.parse_args()
+
+    out_dir = args.out or args.src
+    os.makedirs(out_dir, exist_ok=True)
+    settings = {
+        "rate": OUT_RATE,
+        "loudness_db": args.loudness_db,
+        "ceiling_db": args.ceiling_db,
+        "silence_db": args.silence_db,
+        "pad_ms": args.pad_ms,
+    }
+
+    cache_path = os.path.join(out_dir, CACHE_FILE)
+    cache = load_json(cache_path) or {}
+    if cache.get("settings") != settings:
+        cache = {"settings": settings, "clips": {}}
+    clips = cache["clips"]
+
+    sources = find_sources(args.src)
+    todo = []
+    for name, src_path in sources.items():
+        out_path = os.path.join(out_dir, name)
+        entry = clips.get(name)
+        if not args.force and entry is not None and os.path.exists(out_path):
+            src_hash = file_hash(src_path)
+            # run in place, the source is what we wrote last time
+            if src_hash in (entry["source"], entry["output"]) and file_hash(out_path) == entry["output"]:
+                continue
+        todo.append((name, src_path, out_path))
+
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        futures = {}
+        for name, src_path, out_path in todo:
+            # hashed before it's overwritten, in case it's processed in place
+            futures[pool.submit(process, src_path, out_path, settings)] = (name, file_hash(src_path))
+        for future in concurrent.futures.as_completed(futures):
+            name, src_hash = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print("%-32s FAILED: %s" % (name, e))
+                failed += 1
+                continue
+            result["source"] = src_hash
+            clips[name] = result
+            print("%-32s %6d ms, trimmed %5d ms, %+5.1f dB" % (
+                name, result["duration_ms"], result["trimmed_ms"], result["gain_db"]))
+
+    for name in list(clips):
+        if name not in sources:
+            del clips[name]
+    write_json(cache_path, cache)
+
+    manifest = {}
+    for name in sorted(sources):
+        out_path = os.path.join(out_dir, name)
+        if os.path.exists(out_path):
+            manifest[name] = {"duration_ms": wav_duration_ms(out_path), "bytes": os.path.getsize(out_path)}
+    write_json(os.path.join(out_dir, MANIFEST_FILE), manifest)
+
+    total_ms = sum([clip["duration_ms"] for clip in manifest.values()])
+    print("%d processed, %d unchanged, %d failed, %d clips and %d ms of audio in %s" % (
+        len(todo) - failed, len(sources) - len(todo), failed, len(manifest), total_ms,
+        os.path.join(out_dir, MANIFEST_FILE)))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#
+# Copyright (c) 2026 Team VMPSADBW
+# All rights reserved.
+#
+# This code is licensed under the BSD 3-Clause License.
+#
+
+# Release build: writes a copy of project_3.py with its low level `log_event` calls taken out, so
+# the robot neither loads them nor spends any time on them (the args to a log call are worked out
+# even when nothing gets logged).
+#
+#   python3 tools/strip_logs.py [--keep LOG_WARN] [--program project_3.py] [--out build/project_3.py]
+#
+# Any `log_event(LogType.X, ...)` statement whose X is below --keep (so by default TRACE and DEBUG)
+# goes, and so does any `if log_enabled(LogType.X):` block for one. Everything else, comments
+# included, is copied over untouched, so line numbers in the release build only drift by the
+# lines that were removed. A block that was nothing but log calls is left with a `pass`.
+#
+# Levels are read from the program's own `class LogType`. This needs CPython 3.8 or newer, for
+# `ast`'s end positions.
+
+import argparse
+import ast
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def log_levels(tree):
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "LogType":
+            levels = {}
+            for statement in node.body:
+                if isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Constant):
+                    for target in statement.targets:
+                        levels[target.id] = statement.value.value
+            return levels
+    sys.exit("no `class LogType` in the program")
+
+# The level of a `log_event(LogType.X, ...)` statement, or of an `if log_enabled(LogType.X):` with
+# no else, which guards work that's only done for logging. None for anything else.
+def call_level(statement, levels):
+    if isinstance(statement, ast.If) and not statement.orelse:
+        call = statement.test
+        name = "log_enabled"
+    elif isinstance(statement, ast.Expr):
+        call = statement.value
+        name = "log_event"
+    else:
+        return None
+    if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name) or call.func.id != name or not call.args:
+        return None
+
+    kind = call.args[0]
+    if isinstance(kind, ast.Attribute) and isinstance(kind.value, ast.Name) and kind.value.id == "LogType":
+        return levels.get(kind.attr)
+    return None # worked out at runtime, so we can't tell
+
+# Every list of statements in the tree, i.e. every block that a log call could be sitting in
+def blocks(tree):
+    for node in ast.walk(tree):
+        for field in ("body", "orelse", "finalbody"):
+            block = getattr(node, field, None)
+            if isinstance(block, list) and block and isinstance(block[0], ast.stmt):
+                yield block
+
+def strip(source, keep):
+    tree = ast.parse(source)
+    levels = log_levels(tree)
+    threshold = levels[keep]
+
+    lines = source.splitlines(True)
+    # (first line, last line, replacement) for every call, 0-based and inclusive
+    edits = []
+    for block in blocks(tree):
+        doomed = []
+        for statement in block:
+            level = call_level(statement, levels)
+            if level is not None and level < threshold:
+                doomed.append(statement)
+        if not doomed:
+            continue
+
+        for statement in doomed:
+            first = statement.lineno - 1
+            last = statement.end_lineno - 1
+            before = lines[first][:statement.col_offset]
+            after = lines[last][statement.end_col_offset:]
+            if before.strip() or (after.strip() not in ("", ";") and not after.strip().startswith("#")):
+                sys.exit("line %d: log call shares its line with other code, split it up first" % (first + 1))
+
+            replacement = None
+            if statement is doomed[0] and len(doomed) == len(block):
+                replacement = before + "pass\n"
+            edits.append((first, last, replacement))
+
+    # log calls inside an `if log_enabled` that's going anyway go with it
+    edits = [edit for edit in edits
+             if not [other for other in edits if other is not edit and other[0] <= edit[0] and edit[1] <= other[1]]]
+    removed = len(edits)
+
+    for first, last, replacement in sorted(edits, reverse=True):
+        lines[first:last + 1] = [replacement] if replacement else []
+
+    return "".join(lines), removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a release build of the program without its low level logs")
+    parser.add_argument("--program", default=os.path.join(REPO_DIR, "project_3.py"))
+    parser.add_argument("--out", default=os.path.join(REPO_DIR, "build", "project_3.py"))
+    parser.add_argument("--keep", default="LOG_WARN", help="lowest LogType that stays in (default LOG_WARN)")
+    args = parser.parse_args()
+
+    with open(args.program) as f:
+        source = f.read()
+    stripped, removed = strip(source, args.keep)
+    compile(stripped, args.out, "exec") # never write out something that doesn't even parse
+
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(args.out, "w") as f:
+        f.write(stripped)
+
+    print("removed %d log calls below %s, %d -> %d bytes, wrote %s" % (
+        removed, args.keep, len(source), len(stripped), args.out))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())